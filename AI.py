@@ -1,39 +1,581 @@
-import random
-
-pieceScore = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
-CHECKMATE = 1000
-STALEMATE = 0
-
-def findRandomMove(validMoves: list) -> tuple:
-    return validMoves[random.randint(0, len(validMoves) - 1)]
-
-
-def findBestMove(gs, validMoves: list) -> tuple:
-    """Find the best material move"""
-    turnMultiplier = 1 if gs.white_to_move else -1
-    maxScore = - CHECKMATE
-    bestMove = None
-    for playerMove in validMoves:
-        if gs.checkmate:
-            score = CHECKMATE
-        elif gs.stalemate:
-            score = STALEMATE
-        else:
-            gs.makeMove(playerMove)
-            score = turnMultiplier * scoreMaterial(gs.board)
-        if (score > maxScore):
-            maxScore = score
-            bestMove = playerMove
-        gs.undoMove()
-    return bestMove
-
-def scoreMaterial(board: list) -> int:
-    """Scores the board based on material"""
-    score = 0
-    for row in board:
-        for square in row:
-            if square[0] == "w":
-                score += pieceScore[square[1]]
-            elif square[0] == "b":
-                score -= pieceScore[square[1]]
-    return score
\ No newline at end of file
+import cProfile
+import os
+import random
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from chessEngine import CAPTURE, PROMOTION, GameState
+from evaluation import evaluate, PIECE_VALUES_MG
+from openingBook import OpeningBook
+from tablebase import Tablebase
+
+pieceScore = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
+CHECKMATE = 100000  # search scores are in centipawns
+STALEMATE = 0
+DRAW = 0  # repetitions and the fifty move rule
+MAX_DEPTH = 64
+MAX_PLY = 128  # move buffers preallocated per search
+MAX_TIME = 2.0  # seconds per move when no other budget is given
+TT_SIZE_MB = 16
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")  # used when the file exists
+SYZYGY_PATH = os.environ.get("SYZYGY_PATH")  # directories of Syzygy tables, probed when set
+TABLEBASE_WIN = CHECKMATE - 1000  # below every mate score, so a real mate is still preferred
+# transposition table bound types
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+# move ordering: hash move, captures and promotions by MVV-LVA, killers, then quiet moves by history
+TACTICAL_MOVE = (CAPTURE | PROMOTION) << 12  # flag bits of captures and promotions in a packed move
+MVV_LVA_VALUES = {"p": 1, "N": 2, "B": 3, "R": 4, "Q": 5, "K": 6, "-": 1}  # "-" is the empty en passant square
+HISTORY_MAX = 1 << 26  # history scores are all halved when one reaches this
+# quiescence search skips captures that can't bring the score back to alpha even with this much to spare
+DELTA_MARGIN = 200
+CAPTURE_VALUES = dict(PIECE_VALUES_MG, **{"-": PIECE_VALUES_MG["p"]})  # "-" is the empty en passant square
+
+def findRandomMove(validMoves: list) -> tuple:
+    return validMoves[random.randint(0, len(validMoves) - 1)]
+
+
+def findBookMove(gs, validMoves: list):
+    """A move from the opening book, None without a book or when out of book"""
+    book = defaultBook()
+    return book.chooseMove(gs, validMoves) if book is not None else None
+
+
+def findTablebaseMove(gs, validMoves: list):
+    """The move the endgame tables recommend, None without tables or with too many pieces left"""
+    tablebase = defaultTablebase()
+    if tablebase is None or not tablebase.canProbe(gs):
+        return None
+    return tablebase.bestMove(gs, validMoves)
+
+
+def findBestMove(gs, validMoves: list, max_time: float = MAX_TIME, max_nodes: int = None,
+                 max_depth: int = MAX_DEPTH, stats=None, profile_path: str = None, use_book: bool = True) -> tuple:
+    """Find the best move within the time, node and depth budget, optionally counting into a SearchStats"""
+    book_move = findBookMove(gs, validMoves) if use_book else None
+    if book_move is not None:
+        return book_move
+    tablebase_move = findTablebaseMove(gs, validMoves)
+    if tablebase_move is not None:
+        return tablebase_move
+    return Search(max_time, max_nodes, stats=stats, profile_path=profile_path).iterate(gs, validMoves, max_depth)
+
+
+def findBestMoveParallel(gs, validMoves: list, workers: int = None, max_time: float = MAX_TIME,
+                         max_depth: int = MAX_DEPTH, executor: ProcessPoolExecutor = None,
+                         use_book: bool = True) -> tuple:
+    """
+    Root-parallel search: the root moves are dealt out to worker processes, each searching its share
+    on its own copy of gs, sent as a Snapshot, within the same time budget. Pass an executor to reuse
+    its processes.
+    """
+    book_move = findBookMove(gs, validMoves) if use_book else None
+    if book_move is not None:
+        return book_move
+    tablebase_move = findTablebaseMove(gs, validMoves)
+    if tablebase_move is not None:
+        return tablebase_move
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(validMoves) <= 1:
+        return findBestMove(gs, validMoves, max_time=max_time, max_depth=max_depth, use_book=False)
+    deadline = time.time() + max_time  # wall clock, comparable between processes
+    codes = [move.code for move in validMoves]
+    snapshot = gs.snapshot()
+    shares = [codes[i::workers] for i in range(min(workers, len(codes)))]
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=len(shares))
+    try:
+        futures = [executor.submit(_searchRootMoves, snapshot, share, deadline, max_depth) for share in shares]
+        results = [future.result() for future in futures]
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    if not all(results):
+        # a worker finished no iteration, so its moves have no score to compare: the budget was too short
+        # for the pool to pay off, search all root moves in this process for whatever time is left
+        return findBestMove(gs, validMoves, max_time=max(0.0, deadline - time.time()), max_depth=max_depth,
+                            use_book=False)
+    # scores are only comparable at equal depth: use the deepest iteration every worker finished
+    depth = min(max(iterations) for iterations in results)
+    best_code, _ = max((iterations[depth] for iterations in results), key=lambda result: result[1])
+    return validMoves[codes.index(best_code)]
+
+
+def _searchRootMoves(snapshot, codes: list, deadline: float, max_depth: int) -> dict:
+    """Worker process task: search the given root moves, return {depth: (best move, score)} per finished iteration"""
+    gs = GameState()
+    gs.loadSnapshot(snapshot)
+    moves = [move for move in gs.getValidMoves() if move.code in codes]
+    search = Search(max(0.0, deadline - time.time()))
+    search.iterate(gs, moves, max_depth)
+    return search.iterations
+
+
+class TranspositionTable:
+    """
+    Fixed size table of search results keyed by zobrist key. Each bucket has a depth-preferred slot
+    and an always-replace slot. Entries live in two preallocated arrays of 64 bit words: the key and
+    the packed data (move, depth, bound, search generation and score in the top 32 bits).
+    """
+    SLOT_BYTES = 16
+
+    def __init__(self, size_mb: int = TT_SIZE_MB):
+        self.buckets = max(1, size_mb * 1024 * 1024 // (2 * self.SLOT_BYTES))
+        self.keys = array("Q", bytes(8 * 2 * self.buckets))
+        self.data = array("Q", bytes(8 * 2 * self.buckets))  # 0 marks an empty slot
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.used = 0
+
+    def clear(self) -> None:
+        self.keys = array("Q", bytes(8 * 2 * self.buckets))
+        self.data = array("Q", bytes(8 * 2 * self.buckets))
+        self.generation = 0
+        self.probes = self.hits = self.stores = self.used = 0
+
+    def newSearch(self) -> None:
+        """Age the table so entries of earlier searches give way in the depth-preferred slots"""
+        self.generation = (self.generation + 1) & 63
+
+    def probe(self, key: int) -> tuple:
+        """Return (depth, score, bound, move) stored for key or None"""
+        self.probes += 1
+        slot = (key % self.buckets) * 2
+        for i in (slot, slot + 1):
+            if self.keys[i] == key and self.data[i]:
+                self.hits += 1
+                data = self.data[i]
+                return (data >> 16) & 255, (data >> 32) - (1 << 31), (data >> 24) & 3, data & 65535
+        return None
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: int) -> None:
+        self.stores += 1
+        data = move | depth << 16 | bound << 24 | self.generation << 26 | (score + (1 << 31)) << 32
+        slot = (key % self.buckets) * 2
+        old_data = self.data[slot]
+        if not old_data or self.keys[slot] == key or depth >= (old_data >> 16) & 255 or (
+                (old_data >> 26) & 63) != self.generation:
+            if old_data and self.keys[slot] != key:  # demote the old entry into the always-replace slot
+                self.write(slot + 1, self.keys[slot], old_data)
+            self.write(slot, key, data)
+        else:
+            self.write(slot + 1, key, data)
+
+    def write(self, slot: int, key: int, data: int) -> None:
+        if not self.data[slot]:
+            self.used += 1
+        self.keys[slot] = key
+        self.data[slot] = data
+
+    def hitRate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    def fill(self) -> float:
+        """Fraction of slots in use"""
+        return self.used / (2 * self.buckets)
+
+
+_default_table = None
+
+
+def defaultTable() -> TranspositionTable:
+    """Table shared by searches that don't bring their own, allocated on first use"""
+    global _default_table
+    if _default_table is None:
+        _default_table = TranspositionTable(TT_SIZE_MB)
+    return _default_table
+
+
+_default_book = None
+_default_book_checked = False
+
+
+def defaultBook() -> OpeningBook:
+    """Book at BOOK_PATH, opened on first use; None if there is no book file"""
+    global _default_book, _default_book_checked
+    if not _default_book_checked:
+        _default_book_checked = True
+        if os.path.exists(BOOK_PATH):
+            _default_book = OpeningBook(BOOK_PATH)
+    return _default_book
+
+
+_default_tablebase = None
+_default_tablebase_path = None
+
+
+def defaultTablebase() -> Tablebase:
+    """Tables at SYZYGY_PATH, opened on first use; None if the path isn't set or python-chess is missing"""
+    global _default_tablebase, _default_tablebase_path
+    if SYZYGY_PATH != _default_tablebase_path:  # opened once per path
+        _default_tablebase_path = SYZYGY_PATH
+        if _default_tablebase is not None:
+            _default_tablebase.close()
+        _default_tablebase = None
+        if SYZYGY_PATH:
+            try:
+                _default_tablebase = Tablebase(SYZYGY_PATH)
+            except ImportError:
+                pass
+    return _default_tablebase
+
+
+def scoreToTable(score: int, ply: int) -> int:
+    """Mate and tablebase win scores are stored relative to the node, not the root"""
+    if score > TABLEBASE_WIN - MAX_PLY:
+        return score + ply
+    if score < -TABLEBASE_WIN + MAX_PLY:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score: int, ply: int) -> int:
+    if score > TABLEBASE_WIN - MAX_PLY:
+        return score - ply
+    if score < -TABLEBASE_WIN + MAX_PLY:
+        return score + ply
+    return score
+
+
+class Search:
+    """One iterative deepening negamax search with alpha-beta pruning"""
+    def __init__(self, max_time: float = MAX_TIME, max_nodes: int = None, tt: TranspositionTable = None,
+                 on_iteration=None, stats=None, profile_path: str = None, tablebase: Tablebase = None):
+        self.tt = tt if tt is not None else defaultTable()
+        self.tt.newSearch()
+        self.deadline = None if max_time is None else time.perf_counter() + max_time
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.stopped = False  # set when the budget runs out, every node then returns at once
+        self.depth = 0  # deepest completed iteration
+        self.score = 0
+        self.best_move = None
+        self.iterations = {}  # depth: (best move code, score) of every finished iteration
+        self.move_buffers = [array("H") for _ in range(MAX_PLY)]  # reused by every node at the same ply
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]  # two quiet moves per ply that caused cutoffs
+        self.history = [0] * (2 * 64 * 64)  # cutoff score of quiet moves by side, start and end square
+        self.on_iteration = on_iteration  # called with the search after every finished iteration
+        self.start_time = time.perf_counter()
+        self.stats = stats  # optional SearchStats, counted into only when given
+        self.profile_path = profile_path  # write a cProfile dump of iterate here when given
+        self.tablebase = tablebase if tablebase is not None else defaultTablebase()
+
+    def stop(self) -> None:
+        """Stop the search from another thread, iterate then returns the best move found so far"""
+        self.stopped = True
+
+    def outOfBudget(self) -> bool:
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            return True
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    def iterate(self, gs, validMoves: list, max_depth: int = MAX_DEPTH) -> tuple:
+        """Search one ply deeper each iteration until the budget runs out, return the best move so far"""
+        if self.stats is None and self.profile_path is None:
+            return self._iterate(gs, validMoves, max_depth)
+        profiler = cProfile.Profile() if self.profile_path is not None else None
+        tt_probes, tt_hits = self.tt.probes, self.tt.hits
+        gs.stats = self.stats
+        if profiler is not None:
+            profiler.enable()
+        try:
+            return self._iterate(gs, validMoves, max_depth)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.profile_path)
+            gs.stats = None
+            if self.stats is not None:
+                self.stats.nodes += self.nodes
+                self.stats.tt_probes += self.tt.probes - tt_probes
+                self.stats.tt_hits += self.tt.hits - tt_hits
+
+    def _iterate(self, gs, validMoves: list, max_depth: int) -> tuple:
+        if not validMoves:
+            return None
+        root_moves = {move.code: move for move in validMoves}
+        moves = list(root_moves)
+        best_code = moves[0]
+        for depth in range(1, max_depth + 1):
+            best_score = -CHECKMATE - 1
+            iteration_best = None
+            alpha, beta = -CHECKMATE - 1, CHECKMATE + 1
+            for move in moves:  # previous best move is searched first
+                gs.makeMove(move)
+                score = -self.negamax(gs, depth - 1, -beta, -alpha, 1)
+                gs.undoMove()
+                if self.stopped:
+                    break
+                if score > best_score:
+                    best_score, iteration_best = score, move
+                    alpha = max(alpha, score)
+            if iteration_best is not None and (not self.stopped or iteration_best != best_code):
+                # an unfinished iteration still beats the last one when it searched the old best move first
+                best_code = iteration_best
+                moves.remove(best_code)
+                moves.insert(0, best_code)
+            if self.stopped:
+                break
+            self.depth, self.score = depth, best_score
+            self.iterations[depth] = (best_code, best_score)
+            if self.stats is not None:
+                self.stats.recordIteration(depth, self.elapsed(), self.nodes)
+            if self.on_iteration is not None:
+                self.on_iteration(self)
+            if best_score >= CHECKMATE - depth:  # forced mate found, deeper searches can't improve it
+                break
+        self.best_move = root_moves[best_code]
+        return self.best_move
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start_time
+
+    def principalVariation(self, gs, best_code: int) -> list:
+        """Packed moves of the expected line: best_code followed by the hash moves stored below it"""
+        line = [best_code]
+        gs.makeMove(best_code)
+        buffer = array("H")
+        while len(line) < max(self.depth, 1):
+            entry = self.tt.probe(gs.zobrist_key)
+            if entry is None or entry[3] not in gs.generateValidMoves(buffer):
+                break
+            line.append(entry[3])
+            gs.makeMove(entry[3])
+        for _ in line:
+            gs.undoMove()
+        return line
+
+    def negamax(self, gs, depth: int, alpha: int, beta: int, ply: int) -> int:
+        """Score of the position for the side to move, searched depth plies deep"""
+        self.nodes += 1
+        if self.outOfBudget():
+            self.stopped = True
+            return 0
+        if gs.repetitionCount():
+            return DRAW  # a repeated position is a draw: the side that could avoid it already chose not to
+        if gs.halfmove_clock >= 100:
+            return -CHECKMATE + ply if gs.isCheckmate() else DRAW  # mate on the hundredth ply still counts
+        if depth == 0:
+            return self.quiescence(gs, alpha, beta, ply)
+
+        key = gs.zobrist_key
+        hash_move = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_depth, tt_score, tt_bound, hash_move = entry
+            if tt_depth >= depth:
+                tt_score = scoreFromTable(tt_score, ply)
+                if tt_bound == EXACT or (tt_bound == LOWER_BOUND and tt_score >= beta) or (
+                        tt_bound == UPPER_BOUND and tt_score <= alpha):
+                    return tt_score
+
+        # WDL assumes a fresh fifty move count, so it is exact only right after a capture or pawn move
+        if self.tablebase is not None and gs.halfmove_clock == 0 and self.tablebase.canProbe(gs):
+            wdl = self.tablebase.probeWdl(gs)
+            if wdl is not None:  # exact result; wins spoiled by the fifty move rule count as draws
+                if self.stats is not None:
+                    self.stats.tablebase_hits += 1
+                score = TABLEBASE_WIN - ply if wdl > 1 else -TABLEBASE_WIN + ply if wdl < -1 else 0
+                self.tt.store(key, depth, scoreToTable(score, ply), EXACT, hash_move)
+                return score
+
+        original_alpha = alpha
+        best_score = -CHECKMATE - 1
+        best_move = 0
+        legal_moves = 0
+        # legality is checked only for the moves actually searched
+        for move in self.stagedMoves(gs, hash_move, ply):
+            gs.makeMove(move)
+            if gs.kingLeftInCheck():
+                gs.undoMove()
+                continue
+            legal_moves += 1
+            score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1)
+            gs.undoMove()
+            if self.stopped:
+                return 0
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not move & TACTICAL_MOVE:
+                            self.updateQuietCutoff(gs, move, depth, ply)
+                        if self.stats is not None:
+                            self.stats.cutoffs += 1
+                            self.stats.first_move_cutoffs += legal_moves == 1
+                        break  # opponent will avoid this line
+        if self.stats is not None:
+            self.stats.expanded_nodes += 1
+            self.stats.legal_moves += legal_moves
+        if legal_moves == 0:
+            return -CHECKMATE + ply if gs.inCheck() else STALEMATE  # prefer the quickest mate
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, scoreToTable(best_score, ply), bound, best_move)
+        return best_score
+
+    def quiescence(self, gs, alpha: int, beta: int, ply: int) -> int:
+        """Score of the position searching only captures and promotions, so the horizon never cuts a trade short"""
+        self.nodes += 1
+        if self.stats is not None:
+            self.stats.quiescence_nodes += 1
+        if self.outOfBudget():
+            self.stopped = True
+            return 0
+        stand_pat = evaluate(gs)  # the side to move can usually do at least this well by not capturing
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        best_score = stand_pat
+        board = gs.board
+        for move in self.orderCaptures(gs, gs.generateCaptures(self.move_buffers[ply])):
+            if not move >> 15:  # delta pruning, promotions are always searched
+                end = (move >> 6) & 63
+                if stand_pat + CAPTURE_VALUES[board[end >> 3][end & 7][1]] + DELTA_MARGIN <= alpha:
+                    continue
+            gs.makeMove(move)
+            if gs.kingLeftInCheck():
+                gs.undoMove()
+                continue
+            score = -self.quiescence(gs, -beta, -alpha, ply + 1)
+            gs.undoMove()
+            if self.stopped:
+                return 0
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+    def stagedMoves(self, gs, hash_move: int, ply: int):
+        """
+        Yield the moves of a node in the order to search them, generating them in stages so that a cutoff
+        skips the later ones: hash move, captures and promotions by MVV-LVA, killers, quiet moves by history
+        """
+        if hash_move and gs.isPseudoLegalMove(hash_move):  # a key collision could give a move from elsewhere
+            yield hash_move
+        for move in self.orderCaptures(gs, gs.generateCaptures(self.move_buffers[ply])):
+            if move != hash_move:
+                yield move
+        killers = tuple(self.killers[ply])
+        for move in killers:
+            if move and move != hash_move and gs.isPseudoLegalMove(move):
+                yield move
+        history = self.history
+        side = 0 if gs.white_to_move else 4096
+        quiet_moves = sorted(gs.generateQuietMoves(self.move_buffers[ply]),
+                             key=lambda move: history[side | move & 4095], reverse=True)
+        for move in quiet_moves:
+            if move != hash_move and move not in killers:
+                yield move
+
+    def orderCaptures(self, gs, moves) -> list:
+        """Captures and promotions by MVV-LVA: most valuable victim first, then least valuable attacker"""
+        board = gs.board
+
+        def mvvLva(move):
+            start, end = move & 63, (move >> 6) & 63
+            score = MVV_LVA_VALUES[board[end >> 3][end & 7][1]] * 8 - MVV_LVA_VALUES[board[start >> 3][start & 7][1]]
+            if move >> 15:  # promotions by piece, queen first
+                score += 16 + (move >> 12 & 3) * 8
+            return score
+        return sorted(moves, key=mvvLva, reverse=True)
+
+    def updateQuietCutoff(self, gs, move: int, depth: int, ply: int) -> None:
+        """Remember a quiet move that caused a beta cutoff as a killer and in the history table"""
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        index = (0 if gs.white_to_move else 4096) | move & 4095
+        self.history[index] += depth * depth
+        if self.history[index] >= HISTORY_MAX:
+            self.history = [score // 2 for score in self.history]
+
+
+class Ponderer:
+    """
+    Searches on the opponent's time: while they think, the position after the reply the last search
+    expects is searched on a background thread. The search works on a clone of the game and has a
+    transposition table of its own, so it never writes to the table other searches are reading.
+    """
+    def __init__(self, max_time: float = MAX_TIME, max_depth: int = MAX_DEPTH):
+        self.max_time = max_time  # budget per move, counted from the start of pondering on a hit
+        self.max_depth = max_depth
+        self.search = None
+        self.thread = None
+        self.move = None  # code of the expected reply
+        self.key = None  # zobrist key of the position being searched
+        self.tt = None  # allocated by the first start, kept between ponders, only the ponder thread uses it
+
+    def start(self, gs) -> bool:
+        """Ponder the expected reply to the move just played in gs, False when there is nothing to search"""
+        self.stop()
+        entry = defaultTable().probe(gs.zobrist_key)  # the hash move is the next move of the principal variation
+        if entry is None or entry[3] not in gs.generateValidMoves(array("H")):
+            return False
+        position = gs.clone()
+        position.makeMove(entry[3])
+        valid_moves = position.getValidMoves()
+        book, tablebase = defaultBook(), defaultTablebase()
+        if not valid_moves or (book is not None and book.getMoves(position, valid_moves)) or (
+                tablebase is not None and tablebase.canProbe(position)):
+            return False  # game over or answered without a search
+        if self.tt is None:
+            self.tt = TranspositionTable(TT_SIZE_MB)
+        self.move, self.key = entry[3], position.zobrist_key
+        self.search = Search(None, tt=self.tt)  # no limit until finish
+        self.thread = threading.Thread(target=self.search.iterate, args=(position, valid_moves, self.max_depth),
+                                       daemon=True)
+        self.thread.start()
+        return True
+
+    def finish(self, gs):
+        """
+        The move found by pondering when gs is the position searched (a ponder hit), else None. On a hit
+        the search gets the rest of max_time counted from when pondering started, so after a long wait
+        its move is there at once; on a miss it is stopped and its result thrown away.
+        """
+        if self.thread is None:
+            return None
+        if gs.zobrist_key != self.key:
+            self.stop()
+            return None
+        search = self.search
+        search.deadline = search.start_time + self.max_time
+        self.thread.join()
+        self.search = self.thread = self.move = None
+        return search.best_move
+
+    def stop(self) -> None:
+        if self.thread is not None:
+            self.search.stop()
+            self.thread.join()
+            self.search = self.thread = self.move = None
+
+
+def scoreMaterial(board: list) -> int:
+    """Scores the board based on material"""
+    score = 0
+    for row in board:
+        for square in row:
+            if square[0] == "w":
+                score += pieceScore[square[1]]
+            elif square[0] == "b":
+                score -= pieceScore[square[1]]
+    return score
@@ -0,0 +1,144 @@
+# Evaluation of many positions at once with NumPy (pip install numpy). Positions are encoded once
+# into arrays, after which material, piece-square tables, attacks and mobility are computed for
+# the whole batch with array operations instead of a Python loop per position:
+#
+#   bitboards (N, 12) uint64   GameState.bitboards in the order of chessEngine.PIECES
+#   planes (N, 12, 64) int8    1 where the piece of the plane stands, e.g. input for a neural network
+#   boards (N, 64) int8        1..6 for white pawn..king, -1..-6 for black, 0 for empty
+#
+# Squares are numbered like everywhere else, row * 8 + col with row 0 the 8th rank.
+
+from bitboard import DIRECTIONS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KNIGHT_STEPS, KING_STEPS
+from chessEngine import PIECES
+from evaluation import SQUARE_SCORES_MG, SQUARE_SCORES_EG, PIECE_PHASES, MAX_PHASE
+
+try:
+    import numpy as np
+except ImportError:  # batches are optional, the engine runs without them
+    np = None
+
+PLANE_CODES = (1, 2, 3, 4, 5, 6, -1, -2, -3, -4, -5, -6)  # value of each plane in boards
+
+
+def _requireNumpy() -> None:
+    if np is None:
+        raise ImportError("batch evaluation needs the numpy package")
+
+
+def encodeBitboards(positions) -> "np.ndarray":
+    """(N, 12) uint64 bitboards of the GameStates"""
+    _requireNumpy()
+    return np.array([[gs.bitboards[piece] for piece in PIECES] for gs in positions], dtype=np.uint64).reshape(-1, 12)
+
+
+def encodePlanes(bitboards) -> "np.ndarray":
+    """(N, 12, 64) int8 planes of (N, 12) bitboards"""
+    _requireNumpy()
+    # little endian, so bit i of a board is bit i % 8 of byte i // 8
+    data = np.ascontiguousarray(bitboards, dtype="<u8").view(np.uint8)
+    return np.unpackbits(data, axis=1, bitorder="little").reshape(-1, 12, 64).view(np.int8)
+
+
+def encodeBoards(planes) -> "np.ndarray":
+    """(N, 64) int8 boards of (N, 12, 64) planes"""
+    _requireNumpy()
+    return np.einsum("npq,p->nq", planes, np.array(PLANE_CODES, dtype=np.int8))
+
+
+def sideToMove(positions) -> "np.ndarray":
+    """(N,) bool, True where white is to move"""
+    _requireNumpy()
+    return np.array([gs.white_to_move for gs in positions], dtype=bool)
+
+
+def _tables(scores: dict) -> "np.ndarray":
+    return np.array([scores[piece] for piece in PIECES], dtype=np.int32).reshape(12 * 64)
+
+
+def scorePlanes(planes, white_to_move) -> "np.ndarray":
+    """(N,) int32 tapered material and piece-square score from the side to move, like evaluation.evaluate"""
+    _requireNumpy()
+    flat = planes.reshape(-1, 12 * 64).astype(np.int32)
+    mg = flat @ _tables(SQUARE_SCORES_MG)
+    eg = flat @ _tables(SQUARE_SCORES_EG)
+    counts = planes.sum(axis=2, dtype=np.int32)
+    phase = np.minimum(counts @ np.array([PIECE_PHASES[piece] for piece in PIECES], dtype=np.int32), MAX_PHASE)
+    score = (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+    return np.where(white_to_move, score, -score)
+
+
+def evaluatePositions(positions) -> "np.ndarray":
+    """(N,) int32 evaluation.evaluate of every GameState"""
+    positions = list(positions)
+    return scorePlanes(encodePlanes(encodeBitboards(positions)), sideToMove(positions))
+
+
+# squares a step of d_col columns can land on without wrapping around the board
+_COLUMN_MASKS = {d_col: sum(1 << square for square in range(64) if 0 <= square % 8 - d_col <= 7)
+                 for d_col in range(-2, 3)}
+
+
+def _step(bitboards, d_row: int, d_col: int) -> "np.ndarray":
+    """Every set square moved by (d_row, d_col), squares leaving the board are dropped"""
+    shift = d_row * 8 + d_col
+    if shift > 0:
+        moved = bitboards << np.uint64(shift)
+    else:
+        moved = bitboards >> np.uint64(-shift)
+    return moved & np.uint64(_COLUMN_MASKS[d_col])
+
+
+def _popCount(bitboards) -> "np.ndarray":
+    data = np.ascontiguousarray(bitboards, dtype="<u8")
+    return np.unpackbits(data.view(np.uint8).reshape(data.shape + (8,)), axis=-1).sum(axis=-1, dtype=np.int32)
+
+
+def _pieceAttacks(bitboards, occupied, color: int) -> list:
+    """
+    Attacks of each piece kind and step or direction of one colour (0 white, 1 black) as a list of
+    (N,) bitboards. A piece reaches different squares in each of them, and two sliders on one line
+    only share the square of the one blocking the other, so summing counts over the list counts
+    every piece's targets separately.
+    """
+    boards = bitboards[:, color * 6:color * 6 + 6]
+    pawns, knights, bishops, rooks, queens, kings = (boards[:, i] for i in range(6))
+    forward = -1 if color == 0 else 1
+    attacks = [_step(pawns, forward, -1), _step(pawns, forward, 1)]
+    attacks += [_step(knights, d_row, d_col) for d_row, d_col in KNIGHT_STEPS]
+    empty = ~occupied
+    for directions, sliders in ((ROOK_DIRECTIONS, rooks | queens), (BISHOP_DIRECTIONS, bishops | queens)):
+        for direction in directions:
+            d_row, d_col = DIRECTIONS[direction]
+            ray = _step(sliders, d_row, d_col)
+            reached = ray
+            for _ in range(6):
+                ray = _step(ray & empty, d_row, d_col)
+                reached = reached | ray
+            attacks.append(reached)
+    attacks += [_step(kings, d_row, d_col) for d_row, d_col in KING_STEPS]
+    return attacks
+
+
+def attackMaps(bitboards) -> "np.ndarray":
+    """(N, 2) uint64 squares attacked by white and by black"""
+    _requireNumpy()
+    bitboards = np.asarray(bitboards, dtype=np.uint64)
+    occupied = np.bitwise_or.reduce(bitboards, axis=1)
+    maps = np.zeros((len(bitboards), 2), dtype=np.uint64)
+    for color in (0, 1):
+        for attacks in _pieceAttacks(bitboards, occupied, color):
+            maps[:, color] |= attacks
+    return maps
+
+
+def mobility(bitboards) -> "np.ndarray":
+    """(N, 2) int32 squares without own pieces reached by the knights, bishops, rooks and queens of white and black"""
+    _requireNumpy()
+    bitboards = np.asarray(bitboards, dtype=np.uint64)
+    occupied = np.bitwise_or.reduce(bitboards, axis=1)
+    counts = np.zeros((len(bitboards), 2), dtype=np.int32)
+    for color in (0, 1):
+        own = np.bitwise_or.reduce(bitboards[:, color * 6:color * 6 + 6], axis=1)
+        for attacks in _pieceAttacks(bitboards, occupied, color)[2:-len(KING_STEPS)]:  # no pawns or king
+            counts[:, color] += _popCount(attacks & ~own)
+    return counts
@@ -0,0 +1,82 @@
+# Precomputed attack tables and helpers for 64 bit integer bitboards.
+# Square index is row * 8 + col, row 0 is the 8th rank like in GameState.board
+
+# (row, col) steps; rays in the first four directions run towards higher square indexes
+DIRECTIONS = ((1, 0), (0, 1), (1, 1), (1, -1), (-1, 0), (0, -1), (-1, -1), (-1, 1))
+ROOK_DIRECTIONS = (0, 1, 4, 5)
+BISHOP_DIRECTIONS = (2, 3, 6, 7)
+OPPOSITE = (4, 5, 6, 7, 0, 1, 2, 3)
+
+KNIGHT_STEPS = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+KING_STEPS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def _stepMask(sq: int, steps: tuple) -> int:
+    row, col = divmod(sq, 8)
+    mask = 0
+    for d_row, d_col in steps:
+        end_row, end_col = row + d_row, col + d_col
+        if 0 <= end_row <= 7 and 0 <= end_col <= 7:
+            mask |= 1 << (end_row * 8 + end_col)
+    return mask
+
+
+def _rayMask(sq: int, direction: tuple) -> int:
+    row, col = divmod(sq, 8)
+    mask = 0
+    for i in range(1, 8):
+        end_row, end_col = row + direction[0] * i, col + direction[1] * i
+        if not (0 <= end_row <= 7 and 0 <= end_col <= 7):
+            break
+        mask |= 1 << (end_row * 8 + end_col)
+    return mask
+
+
+KNIGHT_ATTACKS = tuple(_stepMask(sq, KNIGHT_STEPS) for sq in range(64))
+KING_ATTACKS = tuple(_stepMask(sq, KING_STEPS) for sq in range(64))
+# squares attacked by a pawn of the given colour standing on sq
+PAWN_ATTACKS = {"w": tuple(_stepMask(sq, ((-1, -1), (-1, 1))) for sq in range(64)),
+                "b": tuple(_stepMask(sq, ((1, -1), (1, 1))) for sq in range(64))}
+RAYS = tuple(tuple(_rayMask(sq, direction) for sq in range(64)) for direction in DIRECTIONS)
+
+
+def slidingAttacks(sq: int, occupied: int, directions: tuple) -> int:
+    """Squares attacked from sq along the given directions, stopping at the first blocker"""
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if d < 4:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+    return attacks
+
+
+def rookAttacks(sq: int, occupied: int) -> int:
+    return slidingAttacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+def bishopAttacks(sq: int, occupied: int) -> int:
+    return slidingAttacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+def lineMask(sq: int, direction: tuple) -> int:
+    """Both rays through sq along direction (used to keep pinned pieces on the pin line)"""
+    d = DIRECTIONS.index(direction)
+    return RAYS[d][sq] | RAYS[OPPOSITE[d]][sq]
+
+
+def popCount(bitboard: int) -> int:
+    return bin(bitboard).count("1")
+
+
+def squares(bitboard: int):
+    """Yield the square index of every set bit, lowest first"""
+    while bitboard:
+        bit = bitboard & -bitboard
+        yield bit.bit_length() - 1
+        bitboard ^= bit
@@ -1,8 +1,70 @@
 
 # Stores information about the state of the game. Determines valid moves at the state. Move log
 
+import random
+from array import array
+from collections import OrderedDict
+from typing import NamedTuple
+
+from bitboard import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, rookAttacks, bishopAttacks, lineMask, squares
+from evaluation import SQUARE_SCORES_MG, SQUARE_SCORES_EG, PIECE_PHASES, evaluate
+
+PIECES = ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+
+# move flags, the top 4 bits of a packed move; promotions keep the piece index in the low 2 bits
+QUIET = 0
+DOUBLE_PAWN_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+ENPASSANT_CAPTURE = 5
+PROMOTION = 8
+PROMOTION_PIECES = ("N", "B", "R", "Q")
+
+# Zobrist keys, seeded so every process and every run hashes positions the same way
+_zobrist_random = random.Random(0x5A0B)
+ZOBRIST_PIECES = {piece: tuple(_zobrist_random.getrandbits(64) for _ in range(64)) for piece in PIECES}
+ZOBRIST_CASTLING = tuple(_zobrist_random.getrandbits(64) for _ in range(4))  # wks, bks, wqs, bqs
+ZOBRIST_ENPASSANT = tuple(_zobrist_random.getrandbits(64) for _ in range(8))  # by file
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+
+
+# castling rights are one bit each of GameState.castling_rights, in the order of ZOBRIST_CASTLING
+WHITE_KINGSIDE, BLACK_KINGSIDE, WHITE_QUEENSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+# zobrist key of each of the 16 sets of rights
+CASTLING_KEYS = tuple(
+    (ZOBRIST_CASTLING[0] if rights & 1 else 0) ^ (ZOBRIST_CASTLING[1] if rights & 2 else 0) ^
+    (ZOBRIST_CASTLING[2] if rights & 4 else 0) ^ (ZOBRIST_CASTLING[3] if rights & 8 else 0) for rights in range(16))
+# rights kept by a move from or to each square: moving or capturing on a king or rook home square loses some
+_lost_castling = {60: WHITE_KINGSIDE | WHITE_QUEENSIDE, 63: WHITE_KINGSIDE, 56: WHITE_QUEENSIDE,
+                  4: BLACK_KINGSIDE | BLACK_QUEENSIDE, 7: BLACK_KINGSIDE, 0: BLACK_QUEENSIDE}
+CASTLING_MASKS = tuple(ALL_CASTLING & ~_lost_castling.get(square, 0) for square in range(64))
+
+# undo stack: a fixed number of words per move in one preallocated array, grown in chunks when full
+UNDO_MOVE, UNDO_CAPTURED, UNDO_CASTLING, UNDO_ENPASSANT, UNDO_HALFMOVE, UNDO_KEY = range(6)
+UNDO_STRIDE = 6
+UNDO_CHUNK = 512  # moves
+SQUARE_PIECES = PIECES + ("--",)  # captured pieces are stored by index
+PIECE_INDEXES = {piece: i for i, piece in enumerate(SQUARE_PIECES)}
+
+
+class Snapshot(NamedTuple):
+    """
+    Immutable copy of a position, small and quick to pickle. board holds the SQUARE_PIECES index of
+    every square, flags the side to move (bit 0), castling rights (bits 1-4) and en passant square + 1
+    (from bit 5). keys are the zobrist keys of the positions since the last capture or pawn move, as
+    an array("Q") in bytes, so that repetitions are still recognised after GameState.loadSnapshot.
+    """
+    board: bytes
+    flags: int
+    halfmove_clock: int
+    fullmove_number: int
+    keys: bytes = b""
+
+
 class GameState():
-    def __init__(self):
+    def __init__(self, fen: str = None):
         # 8*8 2d list, w/b corresponds to colour. R, N, B, Q, K, P are piece types. -- is empty space
         self.board = [
                 ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
@@ -14,10 +76,22 @@ class GameState():
                 ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
                 ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]
                 ]
+        # one bitboard per piece type and colour plus occupancy masks, kept in sync with board
+        self.bitboards = {}
+        self.occupancy = {}
+        self.occupied = 0
+        # piece-square evaluation sums (white minus black) and game phase, also kept in sync with board
+        self.mg_score = 0
+        self.eg_score = 0
+        self.phase = 0
         self.moveFunctions = {"p": self.getPawnMoves, "R": self.getRookMoves, "N": self.getKnightMoves,
                                 "B": self.getBishopMoves, "Q": self.getQueenMoves, "K": self.getKingMoves}
         self.white_to_move = True
-        self.move_log = []
+        # per move: code, captured piece, and the castling rights, en passant square, halfmove clock and
+        # zobrist key from before it, see UNDO_STRIDE
+        self.undo_stack = array("Q", bytes(8 * UNDO_STRIDE * UNDO_CHUNK))
+        self.ply = 0  # moves made, the undo stack holds this many
+        self.first_ply = 0  # plies before it only hold keys from a snapshot, for repetitions, and can't be undone
         self.white_king_location = (7, 4)
         self.black_king_location = (0, 4)
         self.checkmate = False
@@ -25,11 +99,16 @@ class GameState():
         self.in_check = False
         self.pins = []
         self.checks = []
-        self.enpassant_possible = ()  # coordinates for the square where en-passant capture is possible
-        self.enpassant_possible_log = [self.enpassant_possible]
-        self.current_castling_rights = CastleRights(True, True, True, True)
-        self.castle_rights_log = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                                    self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.enpassant_square = -1  # square where an en passant capture is possible, -1 for none
+        self.castling_rights = ALL_CASTLING  # WHITE_KINGSIDE | BLACK_KINGSIDE | ...
+        self.halfmove_clock = 0  # plies since the last capture or pawn move, for the fifty move rule
+        self.fullmove_number = 1
+        self.stats = None  # SearchStats counting calls while a search is instrumented
+        self.attack_maps = {}  # colour: (zobrist key, attacked squares) of the last position mapped
+        self.zobrist_key = 0  # 64 bit position key, set by setBoard and updated incrementally by make/undo
+        self.setBoard(self.board)
+        if fen is not None:
+            self.loadFen(fen)
 
     def __str__(self):
         lttrs = "   A  B  C  D  E  F  G  H"
@@ -41,90 +120,385 @@ class GameState():
         lines.append(lttrs)
         return "\n".join(lines)
 
-    def makeMove(self, move: list) -> None:
-        """Make a move that is passed as a parameter"""
-        self.board[move.start_row][move.start_col] = "--"
-        self.board[move.end_row][move.end_col] = move.piece_moved
-        self.move_log.append(move)  # log move to undo or display game history
+    @property
+    def move_log(self) -> list:
+        """Packed codes of the moves played"""
+        return [self.undo_stack[ply * UNDO_STRIDE] for ply in range(self.first_ply, self.ply)]
+
+    @property
+    def enpassant_possible(self) -> tuple:
+        """(row, col) of the en passant square or ()"""
+        return divmod(self.enpassant_square, 8) if self.enpassant_square >= 0 else ()
+
+    @property
+    def current_castling_rights(self):
+        """Castling rights as an immutable CastleRights, castling_rights holds them as bits"""
+        rights = self.castling_rights
+        return CastleRights(bool(rights & WHITE_KINGSIDE), bool(rights & BLACK_KINGSIDE),
+                            bool(rights & WHITE_QUEENSIDE), bool(rights & BLACK_QUEENSIDE))
+
+    def setBoard(self, board: list) -> None:
+        """Replace the whole position and rebuild the bitboards, evaluation sums and zobrist key from it"""
+        self.board = [list(row) for row in board]
+        self.bitboards = {piece: 0 for piece in PIECES}
+        self.mg_score = self.eg_score = self.phase = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    self.bitboards[piece] |= 1 << (row * 8 + col)
+                    self.mg_score += SQUARE_SCORES_MG[piece][row * 8 + col]
+                    self.eg_score += SQUARE_SCORES_EG[piece][row * 8 + col]
+                    self.phase += PIECE_PHASES[piece]
+        self.occupancy = {"w": 0, "b": 0}
+        for piece in PIECES:
+            self.occupancy[piece[0]] |= self.bitboards[piece]
+        self.occupied = self.occupancy["w"] | self.occupancy["b"]
+        self.attack_maps = {}
+        self.zobrist_key = self.computeZobristKey()
+
+    def setSquare(self, row: int, col: int, piece: str) -> None:
+        """Put piece (or "--") on the square, updating board, bitboards, zobrist key and evaluation"""
+        square = row * 8 + col
+        bit = 1 << square
+        old_piece = self.board[row][col]
+        if old_piece != "--":
+            self.bitboards[old_piece] ^= bit
+            self.occupancy[old_piece[0]] ^= bit
+            self.occupied ^= bit
+            self.zobrist_key ^= ZOBRIST_PIECES[old_piece][square]
+            self.mg_score -= SQUARE_SCORES_MG[old_piece][square]
+            self.eg_score -= SQUARE_SCORES_EG[old_piece][square]
+            self.phase -= PIECE_PHASES[old_piece]
+        if piece != "--":
+            self.bitboards[piece] |= bit
+            self.occupancy[piece[0]] |= bit
+            self.occupied |= bit
+            self.zobrist_key ^= ZOBRIST_PIECES[piece][square]
+            self.mg_score += SQUARE_SCORES_MG[piece][square]
+            self.eg_score += SQUARE_SCORES_EG[piece][square]
+            self.phase += PIECE_PHASES[piece]
+        self.board[row][col] = piece
+
+    def computeZobristKey(self) -> int:
+        """Hash the whole position from scratch, makeMove and undoMove keep zobrist_key up to date instead"""
+        key = 0
+        for piece in PIECES:
+            bitboard = self.bitboards[piece]
+            while bitboard:
+                bit = bitboard & -bitboard
+                key ^= ZOBRIST_PIECES[piece][bit.bit_length() - 1]
+                bitboard ^= bit
+        if not self.white_to_move:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= CASTLING_KEYS[self.castling_rights]
+        return key ^ self.enpassantKey()
+
+    def enpassantKey(self) -> int:
+        """
+        Zobrist key of the en passant file, only hashed when a pawn of the side to move can capture there,
+        so the key doesn't depend on whether the last double push was capturable (as in Polyglot keys)
+        """
+        square = self.enpassant_square
+        if square < 0:
+            return 0
+        ally_color, enemy_color = ("w", "b") if self.white_to_move else ("b", "w")
+        if PAWN_ATTACKS[enemy_color][square] & self.bitboards[ally_color + "p"]:
+            return ZOBRIST_ENPASSANT[square & 7]
+        return 0
+
+    def loadFen(self, fen: str) -> None:
+        """Set up the position from a FEN string, the move clocks are optional. Raises ValueError for a bad one"""
+        error = ValueError("invalid FEN: " + fen)
+        fields = fen.split()
+        if not 4 <= len(fields) <= 6 or fields[1] not in ("w", "b"):
+            raise error
+        board = []
+        for rank in fields[0].split("/"):
+            row = []
+            for char in rank:
+                if char in "12345678":
+                    row.extend(["--"] * int(char))
+                elif char in "pnbrqkPNBRQK":
+                    row.append(("w" if char.isupper() else "b") + ("p" if char in "pP" else char.upper()))
+                else:
+                    raise error
+            board.append(row)
+        if len(board) != 8 or any(len(row) != 8 for row in board):
+            raise error
+        kings = {piece: [(row, col) for row in range(8) for col in range(8) if board[row][col] == piece]
+                 for piece in ("wK", "bK")}
+        if len(kings["wK"]) != 1 or len(kings["bK"]) != 1:
+            raise error  # exactly one king a side
+        castling = fields[2]
+        if castling != "-" and (not castling or any(char not in "KQkq" or castling.count(char) > 1
+                                                    for char in castling)):
+            raise error
+        enpassant = fields[3]
+        if enpassant != "-" and (len(enpassant) != 2 or enpassant[0] not in Move.files_to_cols or
+                                 enpassant[1] != ("6" if fields[1] == "w" else "3")):
+            raise error  # behind a pawn that just moved two squares
+        clocks = fields[4:]
+        if any(not clock.isdigit() for clock in clocks) or (len(clocks) == 2 and int(clocks[1]) < 1):
+            raise error
+
+        self.setBoard(board)
+        self.white_king_location = kings["wK"][0]
+        self.black_king_location = kings["bK"][0]
+        self.white_to_move = fields[1] == "w"
+        self.castling_rights = ("K" in castling) * WHITE_KINGSIDE | ("k" in castling) * BLACK_KINGSIDE | (
+                "Q" in castling) * WHITE_QUEENSIDE | ("q" in castling) * BLACK_QUEENSIDE
+        if enpassant == "-":
+            self.enpassant_square = -1
+        else:
+            self.enpassant_square = Move.ranks_to_rows[enpassant[1]] * 8 + Move.files_to_cols[enpassant[0]]
+        self.halfmove_clock = int(clocks[0]) if clocks else 0
+        self.fullmove_number = int(clocks[1]) if len(clocks) > 1 else 1
+        self.ply = self.first_ply = 0
+        self.checkmate = False
+        self.stalemate = False
+        self.zobrist_key = self.computeZobristKey()
+
+    def snapshot(self) -> Snapshot:
+        """The position and the keys needed to recognise repetitions, without the rest of the history"""
+        board = bytes(PIECE_INDEXES[piece] for row in self.board for piece in row)
+        flags = self.white_to_move | self.castling_rights << 1 | (self.enpassant_square + 1) << 5
+        first = max(self.ply - self.halfmove_clock, 0)
+        keys = self.undo_stack[first * UNDO_STRIDE + UNDO_KEY:self.ply * UNDO_STRIDE:UNDO_STRIDE]
+        return Snapshot(board, flags, self.halfmove_clock, self.fullmove_number, keys.tobytes())
+
+    def loadSnapshot(self, snapshot: Snapshot) -> None:
+        """Set up the position of a snapshot, its moves can't be undone"""
+        self.setBoard([[SQUARE_PIECES[snapshot.board[row * 8 + col]] for col in range(8)] for row in range(8)])
+        king_squares = {SQUARE_PIECES[piece]: square for square, piece in enumerate(snapshot.board)}
+        self.white_king_location = divmod(king_squares.get("wK", 60), 8)
+        self.black_king_location = divmod(king_squares.get("bK", 4), 8)
+        self.white_to_move = bool(snapshot.flags & 1)
+        self.castling_rights = snapshot.flags >> 1 & ALL_CASTLING
+        self.enpassant_square = (snapshot.flags >> 5) - 1
+        self.halfmove_clock = snapshot.halfmove_clock
+        self.fullmove_number = snapshot.fullmove_number
+        keys = array("Q", snapshot.keys)
+        self.ply = self.first_ply = len(keys)
+        plies = (self.ply // UNDO_CHUNK + 1) * UNDO_CHUNK
+        self.undo_stack = array("Q", bytes(8 * UNDO_STRIDE * plies))
+        self.undo_stack[UNDO_KEY:self.ply * UNDO_STRIDE:UNDO_STRIDE] = keys
+        self.checkmate = False
+        self.stalemate = False
+        self.zobrist_key = self.computeZobristKey()
+
+    def clone(self):
+        """Independent copy of the game, history included; quicker than copy.deepcopy or a FEN round trip"""
+        gs = GameState.__new__(GameState)
+        gs.__dict__.update(self.__dict__)
+        gs.board = [row[:] for row in self.board]
+        gs.bitboards = self.bitboards.copy()
+        gs.occupancy = self.occupancy.copy()
+        gs.undo_stack = array("Q", self.undo_stack)
+        gs.pins = list(self.pins)
+        gs.attack_maps = self.attack_maps.copy()
+        gs.checks = list(self.checks)
+        gs.moveFunctions = {"p": gs.getPawnMoves, "R": gs.getRookMoves, "N": gs.getKnightMoves,
+                            "B": gs.getBishopMoves, "Q": gs.getQueenMoves, "K": gs.getKingMoves}
+        gs.stats = None
+        return gs
+
+    def getFen(self) -> str:
+        """FEN string of the current position"""
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                letter = "P" if piece[1] == "p" else piece[1]
+                rank += letter if piece[0] == "w" else letter.lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        rights = self.castling_rights
+        castling = ("K" if rights & WHITE_KINGSIDE else "") + ("Q" if rights & WHITE_QUEENSIDE else "") + (
+                "k" if rights & BLACK_KINGSIDE else "") + ("q" if rights & BLACK_QUEENSIDE else "")
+        if self.enpassant_square >= 0:
+            enpassant = Move.cols_to_files[self.enpassant_square & 7] + Move.rows_to_ranks[self.enpassant_square >> 3]
+        else:
+            enpassant = "-"
+        return "{} {} {} {} {} {}".format("/".join(ranks), "w" if self.white_to_move else "b", castling or "-",
+                                          enpassant, self.halfmove_clock, self.fullmove_number)
+
+    def makeMove(self, move) -> None:
+        """Make a move that is passed as a parameter, either a Move or its packed int code"""
+        code = move if isinstance(move, int) else move.code
+        start = code & 63
+        end = (code >> 6) & 63
+        flags = code >> 12
+        start_row, start_col = start >> 3, start & 7
+        end_row, end_col = end >> 3, end & 7
+        piece_moved = self.board[start_row][start_col]
+        if flags == ENPASSANT_CAPTURE:
+            piece_captured = self.board[start_row][end_col]
+        else:
+            piece_captured = self.board[end_row][end_col]
+        # log the move and what undoing it restores, without allocating
+        stack = self.undo_stack
+        i = self.ply * UNDO_STRIDE
+        if i == len(stack):
+            stack.frombytes(bytes(8 * UNDO_STRIDE * UNDO_CHUNK))
+        stack[i + UNDO_MOVE] = code
+        stack[i + UNDO_CAPTURED] = PIECE_INDEXES[piece_captured]
+        stack[i + UNDO_CASTLING] = self.castling_rights
+        stack[i + UNDO_ENPASSANT] = self.enpassant_square + 1
+        stack[i + UNDO_HALFMOVE] = self.halfmove_clock
+        stack[i + UNDO_KEY] = self.zobrist_key
+        self.ply += 1
+
+        self.zobrist_key ^= self.enpassantKey()  # depends on the pawns, so hash it out before they move
+        if flags == ENPASSANT_CAPTURE:
+            self.setSquare(start_row, end_col, "--")  # capturing
+        self.setSquare(start_row, start_col, "--")
+        self.setSquare(end_row, end_col, piece_moved)
+        if piece_moved[1] == "p" or piece_captured != "--":
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if not self.white_to_move:
+            self.fullmove_number += 1
         self.white_to_move = not self.white_to_move  # swap players
-        if move.piece_moved == "wK": # update king positions if moved
-            self.white_king_location = (move.end_row, move.end_col)
-        elif move.piece_moved == "bK":
-            self.black_king_location = (move.end_row, move.end_col)
-        
-        # pawn promotion
-        if move.is_pawn_promotion:
-            promotedPiece = input("Promote to Q, R, B, or N: ")
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + promotedPiece
+        self.zobrist_key ^= ZOBRIST_BLACK_TO_MOVE
+        if piece_moved == "wK": # update king positions if moved
+            self.white_king_location = (end_row, end_col)
+        elif piece_moved == "bK":
+            self.black_king_location = (end_row, end_col)
 
-        # enpassant move
-        if move.is_enpassant_move:
-            self.board[move.start_row][move.end_col] = "--"  # capturing
+        # pawn promotion, the piece is part of the move
+        if flags & PROMOTION:
+            self.setSquare(end_row, end_col, piece_moved[0] + PROMOTION_PIECES[flags & 3])
 
-        # update enpassant_possible variable
-        if move.piece_moved[1] == "p" and abs(move.start_row - move.end_row) == 2:  # only on 2 square pawn advance
-            self.enpassant_possible = ((move.start_row + move.end_row) // 2, move.start_col)
+        # update the en passant square
+        if flags == DOUBLE_PAWN_PUSH:
+            self.enpassant_square = (start + end) >> 1
         else:
-            self.enpassant_possible = ()
+            self.enpassant_square = -1
 
         # castle move
-        if move.is_castle_move:
-            if move.end_col - move.start_col == 2:  # king-side castle
-                self.board[move.end_row][move.end_col - 1] = self.board[move.end_row][
-                    move.end_col + 1]  # moves rook
-                self.board[move.end_row][move.end_col + 1] = '--'  # erase old rook
-            else:  # queen-side castle move
-                self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][
-                    move.end_col - 2]  # moves rook
-                self.board[move.end_row][move.end_col - 2] = '--'  # erase old rook
-
-        self.enpassant_possible_log.append(self.enpassant_possible)
+        if flags == KING_CASTLE:
+            self.setSquare(end_row, end_col - 1, self.board[end_row][end_col + 1])  # moves rook
+            self.setSquare(end_row, end_col + 1, '--')  # erase old rook
+        elif flags == QUEEN_CASTLE:
+            self.setSquare(end_row, end_col + 1, self.board[end_row][end_col - 2])  # moves rook
+            self.setSquare(end_row, end_col - 2, '--')  # erase old rook
+
+        self.zobrist_key ^= self.enpassantKey()
 
         # update castling rights - whenever it is a rook or king move
-        self.updateCastleRights(move)
-        self.castle_rights_log.append(CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                                   self.current_castling_rights.wqs, self.current_castling_rights.bqs))
+        rights = self.castling_rights
+        self.castling_rights = rights & CASTLING_MASKS[start] & CASTLING_MASKS[end]
+        self.zobrist_key ^= CASTLING_KEYS[rights] ^ CASTLING_KEYS[self.castling_rights]
 
     def undoMove(self) -> None:
         """Undo last move"""
-        if len(self.move_log) != 0:  # move to undo
-            move = self.move_log.pop()
-            self.board[move.start_row][move.start_col] = move.piece_moved
-            self.board[move.end_row][move.end_col] = move.piece_captured
+        if self.ply > self.first_ply:  # move to undo
+            self.ply -= 1
+            stack = self.undo_stack
+            i = self.ply * UNDO_STRIDE
+            code = stack[i + UNDO_MOVE]
+            piece_captured = SQUARE_PIECES[stack[i + UNDO_CAPTURED]]
+            start = code & 63
+            end = (code >> 6) & 63
+            flags = code >> 12
+            start_row, start_col = start >> 3, start & 7
+            end_row, end_col = end >> 3, end & 7
+            piece_moved = self.board[end_row][end_col]
+            if flags & PROMOTION:
+                piece_moved = piece_moved[0] + "p"
+            self.setSquare(start_row, start_col, piece_moved)
+            if flags == ENPASSANT_CAPTURE:  # undo en passant
+                self.setSquare(end_row, end_col, "--")
+                self.setSquare(start_row, end_col, piece_captured)
+            else:
+                self.setSquare(end_row, end_col, piece_captured)
             self.white_to_move = not self.white_to_move  # swap players
+            if not self.white_to_move:
+                self.fullmove_number -= 1
             # update the king's position if needed
-            if move.piece_moved == "wK":
-                self.white_king_location = (move.start_row, move.start_col)
-            elif move.piece_moved == "bK":
-                self.black_king_location = (move.start_row, move.start_col)
-            
-            # undo en passant
-            if move.is_enpassant_move:
-                self.board[move.end_row][move.end_col] = "--"  # removes wrong square pawn
-                self.board[move.start_row][move.end_col] = move.piece_captured
-
-            self.enpassant_possible_log.pop()
-            self.enpassant_possible = self.enpassant_possible_log[-1]
-
-            # undo castle rights
-            self.castle_rights_log.pop()  # get rid of the new castle rights
-            self.current_castling_rights = self.castle_rights_log[-1]  # set castle rights to last one
+            if piece_moved == "wK":
+                self.white_king_location = (start_row, start_col)
+            elif piece_moved == "bK":
+                self.black_king_location = (start_row, start_col)
             # undo the castle move
-            if move.is_castle_move:
-                if move.end_col - move.start_col == 2:  # king-side
-                    self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][move.end_col - 1]
-                    self.board[move.end_row][move.end_col - 1] = '--'
-                else:  # queen-side
-                    self.board[move.end_row][move.end_col - 2] = self.board[move.end_row][move.end_col + 1]
-                    self.board[move.end_row][move.end_col + 1] = '--'
+            if flags == KING_CASTLE:
+                self.setSquare(end_row, end_col + 1, self.board[end_row][end_col - 1])
+                self.setSquare(end_row, end_col - 1, '--')
+            elif flags == QUEEN_CASTLE:
+                self.setSquare(end_row, end_col - 2, self.board[end_row][end_col + 1])
+                self.setSquare(end_row, end_col + 1, '--')
+            # the rest comes back from the stack, setSquare's key updates are overwritten
+            self.castling_rights = stack[i + UNDO_CASTLING]
+            self.enpassant_square = stack[i + UNDO_ENPASSANT] - 1
+            self.halfmove_clock = stack[i + UNDO_HALFMOVE]
+            self.zobrist_key = stack[i + UNDO_KEY]
             self.checkmate = False
             self.stalemate = False
 
+    def repetitionCount(self) -> int:
+        """
+        How many times the current position occurred before. Only positions since the last capture or
+        pawn move can repeat, so the scan stops there, and only every other one has the same side to move.
+        """
+        if self.halfmove_clock < 4:
+            return 0
+        stack = self.undo_stack
+        key = self.zobrist_key
+        count = 0
+        for ply in range(self.ply - 4, max(self.ply - self.halfmove_clock, 0) - 1, -2):
+            if stack[ply * UNDO_STRIDE + UNDO_KEY] == key:
+                count += 1
+        return count
+
+    def isThreefoldRepetition(self) -> bool:
+        return self.repetitionCount() >= 2
+
+    def isFiftyMoveDraw(self) -> bool:
+        """Fifty moves by each side without a capture or pawn move, unless the last one mated"""
+        return self.halfmove_clock >= 100 and not self.isCheckmate()
+
+    def isCheckmate(self) -> bool:
+        """
+        In check without a legal move. Unlike generateValidMoves this leaves in_check, pins, checks,
+        checkmate and stalemate as they were, so it can be asked in the middle of a search.
+        """
+        if not self.inCheck():
+            return False
+        saved = self.in_check, self.pins, self.checks, self.checkmate, self.stalemate
+        mated = True
+        for code in self.generatePseudoLegalMoves(array("H")):
+            self.makeMove(code)
+            legal = not self.kingLeftInCheck()
+            self.undoMove()
+            if legal:
+                mated = False
+                break
+        self.in_check, self.pins, self.checks, self.checkmate, self.stalemate = saved
+        return mated
+
+    def isDraw(self) -> bool:
+        """Draw by threefold repetition or the fifty move rule"""
+        return self.isThreefoldRepetition() or self.isFiftyMoveDraw()
+
     def getValidMoves(self) -> list:
-        """All moves considering checks"""
-        temp_castle_rights = CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                        self.current_castling_rights.wqs, self.current_castling_rights.bqs)
-        moves = []
+        """All moves considering checks, as Move objects"""
+        return [Move.fromCode(code, self.board) for code in self.generateValidMoves(array("H"))]
+
+    def generateValidMoves(self, moves) -> array:
+        """Fill the moves buffer with the packed codes of all moves considering checks"""
+        if self.stats is not None:
+            self.stats.valid_move_generations += 1
+        del moves[:]
         self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
 
         if self.white_to_move:
@@ -135,38 +509,37 @@ class GameState():
             king_col = self.black_king_location[1]
         if self.in_check:
             if len(self.checks) == 1:  # only 1 check, block or move king
-                moves = self.getAllPossibleMoves()
+                self.getAllPossibleMoves(moves)
                 # to block the check you must put a piece into one of the squares between the enemy piece and your king
                 check = self.checks[0]  # check information
                 check_row = check[0]
                 check_col = check[1]
                 piece_checking = self.board[check_row][check_col]
-                valid_squares = []  # squares that pieces can move to
+                valid_squares = 0  # bitboard of squares that pieces can move to
                 # if knight, must capture the knight or move your king
                 if piece_checking[1] == "N":
-                    valid_squares = [(check_row, check_col)]
+                    valid_squares = 1 << (check_row * 8 + check_col)
                 else:
                     for i in range(1, 8):
-                        valid_square = (king_row + check[2] * i,
-                                        king_col + check[3] * i)  # check[2] and check[3] are the check directions
-                        valid_squares.append(valid_square)
-                        if valid_square[0] == check_row and valid_square[
-                            1] == check_col:  # once you get to piece and check
+                        valid_row = king_row + check[2] * i  # check[2] and check[3] are the check directions
+                        valid_col = king_col + check[3] * i
+                        valid_squares |= 1 << (valid_row * 8 + valid_col)
+                        if valid_row == check_row and valid_col == check_col:  # once you get to piece and check
                             break
+                # en passant captures the checking pawn off the end square
+                checking_pawn_square = check_row * 8 + check_col if piece_checking[1] == "p" else -1
+                king_square = king_row * 8 + king_col
                 # get rid of any moves that don't block check or move king
-                for i in range(len(moves) - 1, -1, -1):  # iterate through the list backwards when removing elements
-                    if moves[i].piece_moved[1] != "K":  # move doesn't move king so it must block or capture
-                        if not (moves[i].end_row,
-                                moves[i].end_col) in valid_squares:  # move doesn't block or capture piece
-                            moves.remove(moves[i])
+                blocking_moves = [code for code in moves if (code & 63) == king_square or (
+                        valid_squares >> ((code >> 6) & 63)) & 1 or (
+                        code >> 12 == ENPASSANT_CAPTURE and (code & 56) | ((code >> 6) & 7) == checking_pawn_square)]
+                del moves[:]
+                moves.extend(blocking_moves)
             else:  # double check, king has to move
                 self.getKingMoves(king_row, king_col, moves)
         else:  # not in check - all moves are fine
-            moves = self.getAllPossibleMoves()
-            if self.white_to_move:
-                self.getCastleMoves(self.white_king_location[0], self.white_king_location[1], moves)
-            else:
-                self.getCastleMoves(self.black_king_location[0], self.black_king_location[1], moves)
+            self.getAllPossibleMoves(moves)
+            self.getCastleMoves(king_row, king_col, moves)
 
         if len(moves) == 0:
             if self.inCheck():
@@ -177,39 +550,210 @@ class GameState():
             self.checkmate = False
             self.stalemate = False
 
-        self.current_castling_rights = temp_castle_rights
         return moves
 
 
     def inCheck(self) -> bool:
         """Determine if a current player is in check"""
         if self.white_to_move:
-            return self.squareUnderAttack(self.white_king_location[0], self.white_king_location[1])
+            return self.isAttacked(self.white_king_location[0] * 8 + self.white_king_location[1], "b")
         else:
-            return self.squareUnderAttack(self.black_king_location[0], self.black_king_location[1])
+            return self.isAttacked(self.black_king_location[0] * 8 + self.black_king_location[1], "w")
+
+    def attackMap(self, color: str) -> int:
+        """
+        Bitboard of the squares color attacks. The other side's king is lifted off the board, so the
+        squares it could step back to along a slider's line count as attacked. Built once per
+        position: the map is kept until the zobrist key changes.
+        """
+        key = self.zobrist_key
+        cached = self.attack_maps.get(color)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        if self.stats is not None:
+            self.stats.attack_map_builds += 1
+        bitboards = self.bitboards
+        occupied = self.occupied ^ bitboards[("b" if color == "w" else "w") + "K"]
+        attacked = 0
+        for square in squares(bitboards[color + "p"]):
+            attacked |= PAWN_ATTACKS[color][square]
+        for square in squares(bitboards[color + "N"]):
+            attacked |= KNIGHT_ATTACKS[square]
+        for square in squares(bitboards[color + "B"] | bitboards[color + "Q"]):
+            attacked |= bishopAttacks(square, occupied)
+        for square in squares(bitboards[color + "R"] | bitboards[color + "Q"]):
+            attacked |= rookAttacks(square, occupied)
+        for square in squares(bitboards[color + "K"]):
+            attacked |= KING_ATTACKS[square]
+        self.attack_maps[color] = (key, attacked)
+        return attacked
+
+    def isAttacked(self, square: int, color: str) -> bool:
+        """Whether color attacks the square, a lookup in its attack map"""
+        return bool(self.attackMap(color) >> square & 1)
 
     def squareUnderAttack(self, row: int, col: int) -> bool:
-        """Determine if enemy can attack the square row col"""
-        self.white_to_move = not self.white_to_move  # switch to opponent
-        opponents_moves = self.getAllPossibleMoves()
-        self.white_to_move = not self.white_to_move
-        for move in opponents_moves:
-            if move.end_row == row and move.end_col == col:  # square is under attack
-                return True
-        return False
+        """
+        Determine if enemy can attack the square row col. The player's own king doesn't block, so a
+        square behind it on a checking line counts as attacked.
+        """
+        return self.isAttacked(row * 8 + col, "b" if self.white_to_move else "w")
+
+    def isSquareAttacked(self, square: int, enemy_color: str, occupied: int = None) -> bool:
+        """Determine if enemy_color attacks the square, optionally with different occupancy for the sliders"""
+        if self.stats is not None:
+            self.stats.attack_tests += 1
+        # look outwards from the square with each piece's attack pattern; generating the opponent's
+        # moves would count pawn pushes as attacks and miss pawn captures onto empty squares
+        if occupied is None:
+            occupied = self.occupied
+        bitboards = self.bitboards
+        if KNIGHT_ATTACKS[square] & bitboards[enemy_color + "N"] or KING_ATTACKS[square] & bitboards[enemy_color + "K"]:
+            return True
+        if PAWN_ATTACKS["b" if enemy_color == "w" else "w"][square] & bitboards[enemy_color + "p"]:
+            return True
+        queens = bitboards[enemy_color + "Q"]
+        if rookAttacks(square, occupied) & (bitboards[enemy_color + "R"] | queens):
+            return True
+        return bool(bishopAttacks(square, occupied) & (bitboards[enemy_color + "B"] | queens))
+
+    def kingLeftInCheck(self) -> bool:
+        """After makeMove: True if the move exposed the mover's own king, so it was not legal"""
+        if self.white_to_move:  # black just moved
+            return self.isSquareAttacked(self.black_king_location[0] * 8 + self.black_king_location[1], "w")
+        return self.isSquareAttacked(self.white_king_location[0] * 8 + self.white_king_location[1], "b")
+
+    def getPseudoLegalMoves(self) -> list:
+        """Moves by piece movement that may leave the own king in check, as Move objects"""
+        return [Move.fromCode(code, self.board) for code in self.generatePseudoLegalMoves(array("H"))]
+
+    def generatePseudoLegalMoves(self, moves) -> array:
+        """
+        Fill the moves buffer with all moves by piece movement, without the pin and check pass of getValidMoves.
+        Some may leave the own king in check: make the move and test kingLeftInCheck before using it.
+        """
+        if self.stats is not None:
+            self.stats.pseudo_legal_generations += 1
+        self.pins = []
+        del moves[:]
+        ally_color = "w" if self.white_to_move else "b"
+        own_pieces = self.occupancy[ally_color]
+        while own_pieces:
+            bit = own_pieces & -own_pieces
+            square = bit.bit_length() - 1
+            own_pieces ^= bit
+            row, col = square >> 3, square & 7
+            piece = self.board[row][col][1]
+            if piece == "K":  # king moves are not tested for checks here
+                self.addMoves(square, KING_ATTACKS[square] & ~self.occupancy[ally_color], moves)
+                self.getCastleMoves(row, col, moves)
+            else:
+                self.moveFunctions[piece](row, col, moves)
+        return moves
+
+    def generateCaptures(self, moves) -> array:
+        """
+        Fill the moves buffer with the pseudo-legal captures and promotions only, for quiescence search.
+        Like generatePseudoLegalMoves, test kingLeftInCheck after making each move.
+        """
+        if self.stats is not None:
+            self.stats.capture_generations += 1
+        del moves[:]
+        ally_color, enemy_color = ("w", "b") if self.white_to_move else ("b", "w")
+        enemies = self.occupancy[enemy_color]
+        occupied = self.occupied
+        bitboards = self.bitboards
+        pawn_attacks = PAWN_ATTACKS[ally_color]
+        push = -8 if self.white_to_move else 8
+        enpassant_square = self.enpassant_square
+        for square in squares(bitboards[ally_color + "p"]):
+            targets = pawn_attacks[square] & enemies
+            while targets:
+                bit = targets & -targets
+                targets ^= bit
+                self.addPawnMove(square, bit.bit_length() - 1, CAPTURE, moves)
+            end = square + push
+            if (end < 8 or end >= 56) and not (occupied >> end) & 1:  # promotion by a push
+                self.addPawnMove(square, end, QUIET, moves)
+            if enpassant_square >= 0 and (pawn_attacks[square] >> enpassant_square) & 1 and \
+                    self.enpassantKeepsKingSafe(square):  # the same test as getPawnMoves
+                moves.append(square | enpassant_square << 6 | ENPASSANT_CAPTURE << 12)
+        for square in squares(bitboards[ally_color + "N"]):
+            self.addMoves(square, KNIGHT_ATTACKS[square] & enemies, moves)
+        for square in squares(bitboards[ally_color + "B"]):
+            self.addMoves(square, bishopAttacks(square, occupied) & enemies, moves)
+        for square in squares(bitboards[ally_color + "R"]):
+            self.addMoves(square, rookAttacks(square, occupied) & enemies, moves)
+        for square in squares(bitboards[ally_color + "Q"]):
+            self.addMoves(square, (rookAttacks(square, occupied) | bishopAttacks(square, occupied)) & enemies, moves)
+        for square in squares(bitboards[ally_color + "K"]):
+            self.addMoves(square, KING_ATTACKS[square] & enemies, moves)
+        return moves
+
+    def generateQuietMoves(self, moves) -> array:
+        """Fill the moves buffer with the pseudo-legal moves generateCaptures leaves out, castling included"""
+        if self.stats is not None:
+            self.stats.quiet_generations += 1
+        del moves[:]
+        ally_color = "w" if self.white_to_move else "b"
+        empty = ~self.occupied
+        occupied = self.occupied
+        bitboards = self.bitboards
+        push = -8 if self.white_to_move else 8
+        start_row = 6 if self.white_to_move else 1
+        for square in squares(bitboards[ally_color + "p"]):
+            end = square + push
+            if end < 8 or end >= 56 or (occupied >> end) & 1:
+                continue  # promotions are generated with the captures
+            moves.append(square | end << 6)
+            if square >> 3 == start_row and not (occupied >> (end + push)) & 1:
+                moves.append(square | (end + push) << 6 | DOUBLE_PAWN_PUSH << 12)
+        for square in squares(bitboards[ally_color + "N"]):
+            self.addMoves(square, KNIGHT_ATTACKS[square] & empty, moves)
+        for square in squares(bitboards[ally_color + "B"]):
+            self.addMoves(square, bishopAttacks(square, occupied) & empty, moves)
+        for square in squares(bitboards[ally_color + "R"]):
+            self.addMoves(square, rookAttacks(square, occupied) & empty, moves)
+        for square in squares(bitboards[ally_color + "Q"]):
+            self.addMoves(square, (rookAttacks(square, occupied) | bishopAttacks(square, occupied)) & empty, moves)
+        for square in squares(bitboards[ally_color + "K"]):
+            self.addMoves(square, KING_ATTACKS[square] & empty, moves)
+            self.getCastleMoves(square >> 3, square & 7, moves)
+        return moves
 
-    def getAllPossibleMoves(self) -> list:
-        """All moves without considering checks."""
-        moves = []
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                turn = self.board[row][col][0]
-                if (turn == "w" and self.white_to_move) or (turn == "b" and not self.white_to_move):
-                    piece = self.board[row][col][1]
-                    self.moveFunctions[piece](row, col, moves)  # calls appropriate move function based on piece type
+    def isPseudoLegalMove(self, code: int) -> bool:
+        """True if code is one of the pseudo-legal moves here, e.g. to check a hash or killer move before using it"""
+        start = code & 63
+        piece = self.board[start >> 3][start & 7]
+        if piece[0] != ("w" if self.white_to_move else "b"):
+            return False
+        moves = array("H")
+        row, col = start >> 3, start & 7
+        if piece[1] == "K":
+            self.addMoves(start, KING_ATTACKS[start] & ~self.occupancy[piece[0]], moves)
+            self.getCastleMoves(row, col, moves)
+        else:
+            self.pins = []
+            self.moveFunctions[piece[1]](row, col, moves)
+        return code in moves
+
+    def getAllPossibleMoves(self, moves=None):
+        """All moves without considering checks, appended to moves as packed codes."""
+        if moves is None:
+            moves = array("H")
+        own_pieces = self.occupancy["w" if self.white_to_move else "b"]
+        while own_pieces:  # walk the set bits instead of all 64 squares
+            bit = own_pieces & -own_pieces
+            square = bit.bit_length() - 1
+            own_pieces ^= bit
+            row, col = square >> 3, square & 7
+            piece = self.board[row][col][1]
+            self.moveFunctions[piece](row, col, moves)  # calls appropriate move function based on piece type
         return moves
 
     def checkForPinsAndChecks(self) -> tuple[bool, list, tuple]:
+        if self.stats is not None:
+            self.stats.pin_and_check_scans += 1
         pins = []  # squares pinned and the direction its pinned from
         checks = []  # squares where enemy is applying a check
         in_check = False
@@ -273,265 +817,206 @@ class GameState():
                     checks.append((end_row, end_col, move[0], move[1]))
         return in_check, pins, checks
 
-    def getPawnMoves(self, row: int, col: int, moves: list) -> None:
+    def getPinDirection(self, row: int, col: int) -> tuple:
+        """Direction of the pin on the piece at row, col or () if it is not pinned"""
+        for pin in self.pins:
+            if pin[0] == row and pin[1] == col:
+                return (pin[2], pin[3])
+        return ()
+
+    def addMoves(self, start: int, targets: int, moves) -> None:
+        """Add a move from the start square to every square set in the targets bitboard."""
+        captures = targets & self.occupied
+        targets ^= captures
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            moves.append(start | (bit.bit_length() - 1) << 6)
+        while captures:
+            bit = captures & -captures
+            captures ^= bit
+            moves.append(start | (bit.bit_length() - 1) << 6 | CAPTURE << 12)
+
+    def addPawnMove(self, start: int, end: int, flags: int, moves) -> None:
+        if end < 8 or end >= 56:  # reached the last rank, one move per promotion piece, queen first
+            code = start | end << 6 | (flags | PROMOTION) << 12
+            moves.append(code | 3 << 12)
+            moves.append(code)
+            moves.append(code | 2 << 12)
+            moves.append(code | 1 << 12)
+        else:
+            moves.append(start | end << 6 | flags << 12)
+
+    def getPawnMoves(self, row: int, col: int, moves) -> None:
         """Get all the pawn moves for the pawn located at row, col and add the moves to the list."""
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        square = row * 8 + col
+        pin_direction = self.getPinDirection(row, col)
+        allowed = lineMask(square, pin_direction) if pin_direction else -1  # pinned pawns stay on the pin line
 
         if self.white_to_move:
             move_amount = -1
             start_row = 6
-            enemy_color = "b"
-            king_row, king_col = self.white_king_location
+            ally_color, enemy_color = "w", "b"
         else:
             move_amount = 1
             start_row = 1
-            enemy_color = "w"
-            king_row, king_col = self.black_king_location
-
-        if self.board[row + move_amount][col] == "--":  # 1 square pawn advance
-            if not piece_pinned or pin_direction == (move_amount, 0):
-                moves.append(Move((row, col), (row + move_amount, col), self.board))
-                if row == start_row and self.board[row + 2 * move_amount][col] == "--":  # 2 square pawn advance
-                    moves.append(Move((row, col), (row + 2 * move_amount, col), self.board))
-        if col - 1 >= 0:  # capture to the left
-            if not piece_pinned or pin_direction == (move_amount, -1):
-                if self.board[row + move_amount][col - 1][0] == enemy_color:
-                    moves.append(Move((row, col), (row + move_amount, col - 1), self.board))
-                if (row + move_amount, col - 1) == self.enpassant_possible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == row:
-                        if king_col < col:  # king is left of the pawn
-                            # inside: between king and the pawn;
-                            # outside: between pawn and border;
-                            inside_range = range(king_col + 1, col - 1)
-                            outside_range = range(col + 1, 8)
-                        else:  # king right of the pawn
-                            inside_range = range(king_col - 1, col, -1)
-                            outside_range = range(col - 2, -1, -1)
-                        for i in inside_range:
-                            if self.board[row][i] != "--":  # some piece beside en-passant pawn blocks
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = self.board[row][i]
-                            if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(Move((row, col), (row + move_amount, col - 1), self.board, is_enpassant_move=True))
-        if col + 1 <= 7:  # capture to the right
-            if not piece_pinned or pin_direction == (move_amount, +1):
-                if self.board[row + move_amount][col + 1][0] == enemy_color:
-                    moves.append(Move((row, col), (row + move_amount, col + 1), self.board))
-                if (row + move_amount, col + 1) == self.enpassant_possible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == row:
-                        if king_col < col:  # king is left of the pawn
-                            # inside: between king and the pawn;
-                            # outside: between pawn and border;
-                            inside_range = range(king_col + 1, col)
-                            outside_range = range(col + 2, 8)
-                        else:  # king right of the pawn
-                            inside_range = range(king_col - 1, col + 1, -1)
-                            outside_range = range(col - 1, -1, -1)
-                        for i in inside_range:
-                            if self.board[row][i] != "--":  # some piece beside en-passant pawn blocks
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = self.board[row][i]
-                            if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(Move((row, col), (row + move_amount, col + 1), self.board, is_enpassant_move=True))
-
-
-    def getRookMoves(self, row: int, col: int, moves: list) -> None:
-        """Get all the rook moves for the rook located at row, col and add the moves to the list."""
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                if self.board[row][col][
-                    1] != "Q":  # can't remove queen from pin on rook moves, only remove it on bishop moves
-                    self.pins.remove(self.pins[i])
-                break
+            ally_color, enemy_color = "b", "w"
+
+        one_step = square + 8 * move_amount
+        if not (self.occupied >> one_step) & 1 and (allowed >> one_step) & 1:  # 1 square pawn advance
+            self.addPawnMove(square, one_step, QUIET, moves)
+            two_step = one_step + 8 * move_amount
+            if row == start_row and not (self.occupied >> two_step) & 1:  # 2 square pawn advance
+                moves.append(square | two_step << 6 | DOUBLE_PAWN_PUSH << 12)
+        attacks = PAWN_ATTACKS[ally_color][square] & allowed
+        captures = attacks & self.occupancy[enemy_color]
+        while captures:
+            bit = captures & -captures
+            captures ^= bit
+            self.addPawnMove(square, bit.bit_length() - 1, CAPTURE, moves)
+        enpassant_square = self.enpassant_square
+        if enpassant_square >= 0 and (attacks >> enpassant_square) & 1 and self.enpassantKeepsKingSafe(square):
+            moves.append(square | enpassant_square << 6 | ENPASSANT_CAPTURE << 12)
 
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
+    def enpassantKeepsKingSafe(self, square: int) -> bool:
+        """
+        Whether the en passant capture by the pawn on square leaves no slider seeing the own king. Both
+        pawns leave their squares at once, so this covers pins of the capturing pawn as well as the
+        captured pawn uncovering a rank.
+        """
         enemy_color = "b" if self.white_to_move else "w"
-        for direction in directions:
-            for i in range(1, 8):
-                end_row = row + direction[0] * i
-                end_col = col + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:  # check for possible moves only in boundaries of the board
-                    if not piece_pinned or pin_direction == direction or pin_direction == (
-                            -direction[0], -direction[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":  # empty space is valid
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:  # capture enemy piece
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                            break
-                        else:  # friendly piece
-                            break
-                else:  # off board
-                    break
+        king_row, king_col = self.white_king_location if self.white_to_move else self.black_king_location
+        enpassant_square = self.enpassant_square
+        captured_square = (square & 56) | (enpassant_square & 7)
+        occupied = (self.occupied ^ (1 << square) ^ (1 << captured_square)) | (1 << enpassant_square)
+        king_square = king_row * 8 + king_col
+        queens = self.bitboards[enemy_color + "Q"]
+        return not (rookAttacks(king_square, occupied) & (self.bitboards[enemy_color + "R"] | queens)) and not (
+                bishopAttacks(king_square, occupied) & (self.bitboards[enemy_color + "B"] | queens))
 
-    def getKnightMoves(self, row: int, col: int, moves: list) -> None:
-        """Get all the knight moves for the knight located at row col and add the moves to the list."""
-        piece_pinned = False
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                self.pins.remove(self.pins[i])
-                break
+    def getRookMoves(self, row: int, col: int, moves) -> None:
+        """Get all the rook moves for the rook located at row, col and add the moves to the list."""
+        square = row * 8 + col
+        ally_color = "w" if self.white_to_move else "b"
+        targets = rookAttacks(square, self.occupied) & ~self.occupancy[ally_color]
+        pin_direction = self.getPinDirection(row, col)
+        if pin_direction:
+            targets &= lineMask(square, pin_direction)
+        self.addMoves(square, targets, moves)
 
-        knight_moves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2),
-                        (1, -2))  # up/left up/right right/up right/down down/left down/right left/up left/down
+    def getKnightMoves(self, row: int, col: int, moves) -> None:
+        """Get all the knight moves for the knight located at row col and add the moves to the list."""
+        if self.getPinDirection(row, col):
+            return  # a pinned knight can never move
         ally_color = "w" if self.white_to_move else "b"
-        for move in knight_moves:
-            end_row = row + move[0]
-            end_col = col + move[1]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                if not piece_pinned:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] != ally_color:  # so its either enemy piece or empty square
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
+        self.addMoves(row * 8 + col, KNIGHT_ATTACKS[row * 8 + col] & ~self.occupancy[ally_color], moves)
 
-    def getBishopMoves(self, row: int, col: int, moves: list) -> None:
+    def getBishopMoves(self, row: int, col: int, moves) -> None:
         """Get all the bishop moves for the bishop located at row col and add the moves to the list."""
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-
-        directions = ((-1, -1), (-1, 1), (1, 1), (1, -1))  # diagonals: up/left up/right down/right down/left
-        enemy_color = "b" if self.white_to_move else "w"
-        for direction in directions:
-            for i in range(1, 8):
-                end_row = row + direction[0] * i
-                end_col = col + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:  # check if the move is on board
-                    if not piece_pinned or pin_direction == direction or pin_direction == (
-                            -direction[0], -direction[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":  # empty space is valid
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:  # capture enemy piece
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                            break
-                        else:  # friendly piece
-                            break
-                else:  # off board
-                    break
+        square = row * 8 + col
+        ally_color = "w" if self.white_to_move else "b"
+        targets = bishopAttacks(square, self.occupied) & ~self.occupancy[ally_color]
+        pin_direction = self.getPinDirection(row, col)
+        if pin_direction:
+            targets &= lineMask(square, pin_direction)
+        self.addMoves(square, targets, moves)
 
-    def getQueenMoves(self, row: int, col: int, moves: list) -> None:
+    def getQueenMoves(self, row: int, col: int, moves) -> None:
         """Get all the queen moves for the queen located at row col and add the moves to the list."""
-        self.getBishopMoves(row, col, moves)
-        self.getRookMoves(row, col, moves)
+        square = row * 8 + col
+        ally_color = "w" if self.white_to_move else "b"
+        targets = (rookAttacks(square, self.occupied) | bishopAttacks(square, self.occupied)) & ~self.occupancy[
+            ally_color]
+        pin_direction = self.getPinDirection(row, col)
+        if pin_direction:
+            targets &= lineMask(square, pin_direction)
+        self.addMoves(square, targets, moves)
 
-    def getKingMoves(self, row: int, col: int, moves: list) -> None:
+    def getKingMoves(self, row: int, col: int, moves) -> None:
         """
         Get all the king moves for the king located at row col and add the moves to the list.
         """
-        row_moves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        col_moves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        ally_color = "w" if self.white_to_move else "b"
-        for i in range(8):
-            end_row = row + row_moves[i]
-            end_col = col + col_moves[i]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:  # not an ally piece - empty or enemy
-                    # place king on end square and check for checks
-                    if ally_color == "w":
-                        self.white_king_location = (end_row, end_col)
-                    else:
-                        self.black_king_location = (end_row, end_col)
-                    in_check, pins, checks = self.checkForPinsAndChecks()
-                    if not in_check:
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                    # place king back on original location
-                    if ally_color == "w":
-                        self.white_king_location = (row, col)
-                    else:
-                        self.black_king_location = (row, col)
-
-    def updateCastleRights(self, move: list) -> None:
-        """Update castle rights given the move"""
-        if move.piece_captured == "wR":
-            if move.end_col == 0:  # left rook
-                self.current_castling_rights.wqs = False
-            elif move.end_col == 7:  # right rook
-                self.current_castling_rights.wks = False
-        elif move.piece_captured == "bR":
-            if move.end_col == 0:  # left rook
-                self.current_castling_rights.bqs = False
-            elif move.end_col == 7:  # right rook
-                self.current_castling_rights.bks = False
-
-        if move.piece_moved == 'wK':
-            self.current_castling_rights.wqs = False
-            self.current_castling_rights.wks = False
-        elif move.piece_moved == 'bK':
-            self.current_castling_rights.bqs = False
-            self.current_castling_rights.bks = False
-        elif move.piece_moved == 'wR':
-            if move.start_row == 7:
-                if move.start_col == 0:  # left rook
-                    self.current_castling_rights.wqs = False
-                elif move.start_col == 7:  # right rook
-                    self.current_castling_rights.wks = False
-        elif move.piece_moved == 'bR':
-            if move.start_row == 0:
-                if move.start_col == 0:  # left rook
-                    self.current_castling_rights.bqs = False
-                elif move.start_col == 7:  # right rook
-                    self.current_castling_rights.bks = False
+        ally_color, enemy_color = ("w", "b") if self.white_to_move else ("b", "w")
+        square = row * 8 + col
+        # the enemy map sees through the king, so a slider's ray doesn't stop at it
+        safe = KING_ATTACKS[square] & ~self.occupancy[ally_color] & ~self.attackMap(enemy_color)
+        self.addMoves(square, safe, moves)
 
     def getCastleMoves(self, row, col, moves):
         """Generate all valid castle moves for the king at (row, col) and add them to the list of moves."""
-        if self.squareUnderAttack(row, col):
+        attacked = self.attackMap("b" if self.white_to_move else "w")
+        square = row * 8 + col
+        if attacked >> square & 1:
             return  # can't castle while in check
-        if (self.white_to_move and self.current_castling_rights.wks) or (
-                not self.white_to_move and self.current_castling_rights.bks):
-            self.getKingsideCastleMoves(row, col, moves)
-        if (self.white_to_move and self.current_castling_rights.wqs) or (
-                not self.white_to_move and self.current_castling_rights.bqs):
-            self.getQueensideCastleMoves(row, col, moves)
-
-    def getKingsideCastleMoves(self, row, col, moves):
-        if self.board[row][col + 1] == '--' and self.board[row][col + 2] == '--':
-            if not self.squareUnderAttack(row, col + 1) and not self.squareUnderAttack(row, col + 2):
-                moves.append(Move((row, col), (row, col + 2), self.board, is_castle_move=True))
-
-    def getQueensideCastleMoves(self, row, col, moves):
-        if self.board[row][col - 1] == '--' and self.board[row][col - 2] == '--' and self.board[row][col - 3] == '--':
-            if not self.squareUnderAttack(row, col - 1) and not self.squareUnderAttack(row, col - 2):
-                moves.append(Move((row, col), (row, col - 2), self.board, is_castle_move=True))
-        
-class CastleRights:
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
+        rights = self.castling_rights
+        if rights & (WHITE_KINGSIDE if self.white_to_move else BLACK_KINGSIDE):
+            self.getKingsideCastleMoves(row, col, moves, attacked)
+        if rights & (WHITE_QUEENSIDE if self.white_to_move else BLACK_QUEENSIDE):
+            self.getQueensideCastleMoves(row, col, moves, attacked)
+
+    def getKingsideCastleMoves(self, row, col, moves, attacked):
+        """attacked is the enemy attack map; the king must not pass or land on an attacked square"""
+        square = row * 8 + col
+        if not (self.occupied | attacked) & (0b11 << (square + 1)):
+            moves.append(square | (square + 2) << 6 | KING_CASTLE << 12)
+
+    def getQueensideCastleMoves(self, row, col, moves, attacked):
+        square = row * 8 + col
+        if not self.occupied & (0b111 << (square - 3)) and not attacked & (0b11 << (square - 2)):
+            moves.append(square | (square - 2) << 6 | QUEEN_CASTLE << 12)
+
+
+class PositionCache:
+    """
+    Bounded LRU cache of FEN -> (valid move codes, evaluation) for jobs that load many positions.
+    Keys leave out the move clocks, which change neither the moves nor the evaluation.
+    """
+    def __init__(self, max_size: int = 100000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, fen: str) -> tuple:
+        """Return (tuple of packed valid moves, evaluation for the side to move) of the position"""
+        key = " ".join(fen.split()[:4])
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+        self.misses += 1
+        gs = GameState(fen)
+        entry = (tuple(gs.generateValidMoves(array("H"))), evaluate(gs))
+        self.entries[key] = entry
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)  # least recently used
+        return entry
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CastleRights(NamedTuple):
+    """Read-only view of GameState.castling_rights; change the rights through the bits"""
+    wks: bool
+    bks: bool
+    wqs: bool
+    bqs: bool
+
 
 class Move:
+    """
+    Readable view of a move for the UI and notation. Generation, search and the move log work with the
+    packed int in code instead: start square | end square << 6 | flags << 12.
+    """
+    __slots__ = ("start_row", "start_col", "end_row", "end_col", "piece_moved", "piece_captured",
+                 "is_pawn_promotion", "promotion_piece", "is_enpassant_move", "is_castle_move", "is_capture", "moveID",
+                 "code")
     # maps keys to values
     # key : value
     ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4,
@@ -541,7 +1026,8 @@ class Move:
                      "e": 4, "f": 5, "g": 6, "h": 7}
     cols_to_files = {v: k for k, v in files_to_cols.items()}
 
-    def __init__(self, start_square: tuple, end_square: tuple, board: list, is_enpassant_move: bool = False, is_castle_move:bool = False):
+    def __init__(self, start_square: tuple, end_square: tuple, board: list, is_enpassant_move: bool = False, is_castle_move:bool = False,
+                 promotion_piece: str = "Q"):
         self.start_row = start_square[0]
         self.start_col = start_square[1]
         self.end_row = end_square[0]
@@ -551,6 +1037,7 @@ class Move:
         # pawn promotion
         self.is_pawn_promotion = (self.piece_moved == "wp" and self.end_row == 0) or (
                 self.piece_moved == "bp" and self.end_row == 7)
+        self.promotion_piece = promotion_piece if self.is_pawn_promotion else ""
         # en passant
         self.is_enpassant_move = is_enpassant_move
         if self.is_enpassant_move:
@@ -561,19 +1048,44 @@ class Move:
         self.is_capture = self.piece_captured != "--"
         self.moveID = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
 
+        if is_castle_move:
+            flags = KING_CASTLE if self.end_col > self.start_col else QUEEN_CASTLE
+        elif is_enpassant_move:
+            flags = ENPASSANT_CAPTURE
+        else:
+            flags = CAPTURE if self.is_capture else QUIET
+            if self.piece_moved[1] == "p" and abs(self.start_row - self.end_row) == 2:
+                flags = DOUBLE_PAWN_PUSH
+            if self.is_pawn_promotion:
+                flags |= PROMOTION | PROMOTION_PIECES.index(promotion_piece)
+        self.code = (self.start_row * 8 + self.start_col) | (self.end_row * 8 + self.end_col) << 6 | flags << 12
+
+    @classmethod
+    def fromCode(cls, code: int, board: list):
+        """Decode a packed move, board is the position the move is played from"""
+        start = code & 63
+        end = (code >> 6) & 63
+        flags = code >> 12
+        return cls((start >> 3, start & 7), (end >> 3, end & 7), board, is_enpassant_move=flags == ENPASSANT_CAPTURE,
+                   is_castle_move=flags == KING_CASTLE or flags == QUEEN_CASTLE,
+                   promotion_piece=PROMOTION_PIECES[flags & 3] if flags & PROMOTION else "Q")
+
     def __eq__(self, other):
         """
         Overriding the equals method.
         """
         if isinstance(other, Move):
-            return self.moveID == other.moveID
+            return self.moveID == other.moveID and self.promotion_piece == other.promotion_piece
         return False
 
     def getChessNotation(self):
         if self.is_pawn_promotion:
-            return self.getRankFile(self.end_row, self.end_col) + "Q"
+            if self.is_capture:
+                return self.getRankFile(self.start_row, self.start_col)[0] + "x" + self.getRankFile(
+                    self.end_row, self.end_col) + self.promotion_piece
+            return self.getRankFile(self.end_row, self.end_col) + self.promotion_piece
         if self.is_castle_move:
-            if self.end_col == 1:
+            if self.end_col == 2:
                 return "0-0-0"
             else:
                 return "0-0"
@@ -595,6 +1107,11 @@ class Move:
     def getRankFile(self, row, col):
         return self.cols_to_files[col] + self.rows_to_ranks[row]
 
+    def getUciNotation(self):
+        """Coordinate notation used by perft divide and engine protocols, e.g. e2e4"""
+        return self.getRankFile(self.start_row, self.start_col) + self.getRankFile(self.end_row, self.end_col) + \
+            self.promotion_piece.lower()
+
     def __str__(self):
         if self.is_castle_move:
             return "0-0" if self.end_col == 6 else "0-0-0"
@@ -603,9 +1120,9 @@ class Move:
 
         if self.piece_moved[1] == "p":
             if self.is_capture:
-                return self.cols_to_files[self.start_col] + "x" + end_square
+                return self.cols_to_files[self.start_col] + "x" + end_square + self.promotion_piece
             else:
-                return end_square + "Q" if self.is_pawn_promotion else end_square
+                return end_square + self.promotion_piece
 
         move_string = self.piece_moved[1]
         if self.is_capture:
@@ -19,6 +19,7 @@ def main():
             "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
     # game type
+    pondering = False
     if input("2 player match?(y/n): ") == "y":
         playerOne, playerTwo = True, False
     else:
@@ -26,6 +27,8 @@ def main():
             playerOne = True
         else:
             playerOne = False
+        pondering = input("Let the AI think on your time?(y/n): ") == "y"
+    ponderer = AI.Ponderer()
     playerTwo = not playerOne
     while running:
         humanTurn = (gs.white_to_move and playerOne) or (not gs.white_to_move and playerTwo)
@@ -35,9 +38,11 @@ def main():
         if not gameOver and humanTurn:
             user = input("enter square: col,row: ").split(",")
             if user == ["undo"]:
+                ponderer.stop() # the position pondered on is gone
                 gs.undoMove()
                 move_made = True
             elif user == ["quit"] or user == ["exit"]:
+                ponderer.stop()
                 running = False
             elif user != ["quit"] or user != ["exit"] or user != ["undo"]:
                 user = (filesToCols[user[0]], ranksToRows[user[1]])
@@ -50,8 +55,15 @@ def main():
                     playerClicks.append(sqSelected) # append both 1st and 2nd clicks
                     if len(playerClicks) == 2: # after 2nd move
                         move = chessEngine.Move(playerClicks[0], playerClicks[1], gs.board)
+                        if move.is_pawn_promotion: # the promotion piece is part of the move
+                            promotedPiece = input("Promote to Q, R, B, or N: ").upper()
+                            if promotedPiece in chessEngine.PROMOTION_PIECES:
+                                move = chessEngine.Move(playerClicks[0], playerClicks[1], gs.board,
+                                                        promotion_piece=promotedPiece)
                         for i in range(len(valid_moves)):
                             if move == valid_moves[i]:
+                                if valid_moves[i].code != ponderer.move:
+                                    ponderer.stop() # not the expected reply, the pondering is wasted
                                 gs.makeMove(valid_moves[i])
                                 sqSelected = () # reset user clicks
                                 playerClicks = []
@@ -61,12 +73,17 @@ def main():
 
         # ai move
         if not gameOver and not humanTurn:
-            aiMove = None
-            aiMove = AI.findBestMove(gs, valid_moves)
+            aiMove = ponderer.finish(gs) # the move searched on the player's time if they played the expected reply
+            if aiMove is None:
+                aiMove = AI.findBookMove(gs, valid_moves) # opening book first, no need to search known moves
+            if aiMove is None:
+                aiMove = AI.findBestMove(gs, valid_moves, use_book=False)
             if aiMove == None:
                 aiMove = AI.findRandomMove(valid_moves)
             gs.makeMove(aiMove)
             move_made = True
+            if pondering:
+                ponderer.start(gs)
         
         if move_made:
             valid_moves = gs.getValidMoves()
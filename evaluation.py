@@ -0,0 +1,116 @@
+# Material and piece-square tables for the tapered evaluation. GameState keeps the sums up to date
+# in setSquare, so evaluating a position is O(1) instead of a scan of the whole board.
+# Tables are from white's point of view with the 8th rank first, like GameState.board.
+
+PIECE_VALUES_MG = {"p": 100, "N": 320, "B": 330, "R": 500, "Q": 900, "K": 0}
+PIECE_VALUES_EG = {"p": 120, "N": 300, "B": 320, "R": 520, "Q": 920, "K": 0}
+PHASE_WEIGHTS = {"p": 0, "N": 1, "B": 1, "R": 2, "Q": 4, "K": 0}
+MAX_PHASE = 24  # all minor and major pieces on the board
+
+PAWN_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0)
+
+PAWN_TABLE_EG = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     15,  15,  15,  15,  15,  15,  15,  15,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0)
+
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50)
+
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20)
+
+ROOK_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0)
+
+QUEEN_TABLE = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20)
+
+KING_TABLE_MG = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20)
+
+KING_TABLE_EG = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50)
+
+PIECE_TABLES_MG = {"p": PAWN_TABLE, "N": KNIGHT_TABLE, "B": BISHOP_TABLE, "R": ROOK_TABLE, "Q": QUEEN_TABLE,
+                   "K": KING_TABLE_MG}
+PIECE_TABLES_EG = {"p": PAWN_TABLE_EG, "N": KNIGHT_TABLE, "B": BISHOP_TABLE, "R": ROOK_TABLE, "Q": QUEEN_TABLE,
+                   "K": KING_TABLE_EG}
+
+
+def _squareScores(piece: str, values: dict, tables: dict) -> tuple:
+    """Material plus table bonus of piece on every square, signed so white is positive"""
+    color, kind = piece[0], piece[1]
+    if color == "w":
+        return tuple(values[kind] + tables[kind][square] for square in range(64))
+    return tuple(-(values[kind] + tables[kind][square ^ 56]) for square in range(64))  # mirror the ranks
+
+
+# score contribution of every piece on every square, e.g. SQUARE_SCORES_MG["bN"][square]
+SQUARE_SCORES_MG = {color + kind: _squareScores(color + kind, PIECE_VALUES_MG, PIECE_TABLES_MG)
+                    for color in "wb" for kind in "pNBRQK"}
+SQUARE_SCORES_EG = {color + kind: _squareScores(color + kind, PIECE_VALUES_EG, PIECE_TABLES_EG)
+                    for color in "wb" for kind in "pNBRQK"}
+PIECE_PHASES = {color + kind: PHASE_WEIGHTS[kind] for color in "wb" for kind in "pNBRQK"}
+
+
+def evaluate(gs) -> int:
+    """Tapered evaluation in centipawns from the point of view of the side to move"""
+    phase = min(gs.phase, MAX_PHASE)
+    score = (gs.mg_score * phase + gs.eg_score * (MAX_PHASE - phase)) // MAX_PHASE
+    return score if gs.white_to_move else -score
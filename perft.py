@@ -0,0 +1,165 @@
+# Perft driver. Counts the leaf nodes of the legal move tree to check move generation against
+# known results and to measure how fast getValidMoves, makeMove and undoMove are.
+
+import argparse
+import time
+from array import array
+
+import chessEngine
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# name, FEN and known node counts per depth (chessprogramming.org perft results and
+# Martin Sedlak's collection of en passant, castling, promotion and stalemate edge cases)
+POSITIONS = (
+    ("start position", START_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890}),
+    ("illegal en passant 1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", {6: 1134888}),
+    ("illegal en passant 2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", {6: 1015133}),
+    ("en passant gives check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", {6: 1440467}),
+    ("short castle gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", {6: 661072}),
+    ("long castle gives check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", {6: 803711}),
+    ("castling rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", {4: 1274206}),
+    ("castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", {4: 1720476}),
+    ("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", {6: 3821001}),
+    ("discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", {5: 1004658}),
+    ("promote to give check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", {6: 217342}),
+    ("underpromote to give check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", {6: 92683}),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", {6: 2217}),
+    ("stalemate and checkmate", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", {7: 567584}),
+    ("stalemate and checkmate 2", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", {4: 23527}),
+)
+
+
+def perft(gs, depth: int, buffers: list = None) -> int:
+    """Number of leaf nodes depth plies below the current position"""
+    if depth == 0:
+        return 1
+    if buffers is None:  # one reusable move buffer per remaining depth
+        buffers = [array("H") for _ in range(depth + 1)]
+    moves = gs.generateValidMoves(buffers[depth])
+    if depth == 1:  # bulk counting, no need to play the last ply
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1, buffers)
+        gs.undoMove()
+    return nodes
+
+
+def perftPseudoLegal(gs, depth: int, buffers: list = None) -> int:
+    """Perft through generatePseudoLegalMoves, dropping illegal moves after making them like the search does"""
+    if depth == 0:
+        return 1
+    if buffers is None:
+        buffers = [array("H") for _ in range(depth + 1)]
+    nodes = 0
+    for move in gs.generatePseudoLegalMoves(buffers[depth]):
+        gs.makeMove(move)
+        if not gs.kingLeftInCheck():
+            nodes += perftPseudoLegal(gs, depth - 1, buffers)
+        gs.undoMove()
+    return nodes
+
+
+def perftStaged(gs, depth: int, buffers: list = None) -> int:
+    """Perft through generateCaptures and generateQuietMoves, the staged generation the search uses"""
+    if depth == 0:
+        return 1
+    if buffers is None:  # two buffers per remaining depth, captures and quiet moves
+        buffers = [(array("H"), array("H")) for _ in range(depth + 1)]
+    captures, quiets = buffers[depth]
+    gs.generateCaptures(captures)
+    gs.generateQuietMoves(quiets)
+    nodes = 0
+    for moves in (captures, quiets):
+        for move in moves:
+            gs.makeMove(move)
+            if not gs.kingLeftInCheck():
+                nodes += perftStaged(gs, depth - 1, buffers)
+            gs.undoMove()
+    return nodes
+
+
+def divide(gs, depth: int, count=perft) -> dict:
+    """Perft split by root move, keyed by coordinate notation"""
+    results = {}
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        results[move.getUciNotation()] = count(gs, depth - 1)
+        gs.undoMove()
+    return results
+
+
+def timedPerft(fen: str, depth: int, count=perft) -> tuple:
+    """Run perft on a fresh position, returns (nodes, seconds)"""
+    gs = chessEngine.GameState(fen)
+    start = time.perf_counter()
+    nodes = count(gs, depth)
+    return nodes, time.perf_counter() - start
+
+
+def runSuite(max_depth: int = 6, max_nodes: int = 1000000, count=perft) -> bool:
+    """Check every reference count up to max_depth and max_nodes, print results and nodes per second"""
+    all_passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, counts in POSITIONS:
+        for depth, expected in sorted(counts.items()):
+            if depth > max_depth or expected > max_nodes:
+                continue
+            nodes, seconds = timedPerft(fen, depth, count)
+            passed = nodes == expected
+            all_passed = all_passed and passed
+            total_nodes += nodes
+            total_time += seconds
+            print("{:<26} depth {} {:>9} nodes {:>9.0f} nps  {}".format(
+                name, depth, nodes, nodes / max(seconds, 1e-9), "ok" if passed else "FAIL expected %d" % expected))
+    print("total {} nodes in {:.2f}s, {:.0f} nps".format(total_nodes, total_time, total_nodes / max(total_time, 1e-9)))
+    return all_passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count move generation leaf nodes")
+    parser.add_argument("depth", type=int, nargs="?", help="depth to search, runs the reference suite if omitted")
+    parser.add_argument("--fen", default=START_FEN, help="position to search from")
+    parser.add_argument("--divide", action="store_true", help="print the node count of every root move")
+    parser.add_argument("--max-depth", type=int, default=6, help="deepest reference count the suite checks")
+    parser.add_argument("--max-nodes", type=int, default=1000000, help="largest reference count the suite checks")
+    generation = parser.add_mutually_exclusive_group()
+    generation.add_argument("--pseudo", action="store_true",
+                            help="generate pseudo-legal moves and check legality after making them")
+    generation.add_argument("--staged", action="store_true",
+                            help="generate captures, then quiet moves, and check legality after making them")
+    args = parser.parse_args()
+    count = perftStaged if args.staged else perftPseudoLegal if args.pseudo else perft
+
+    if args.depth is None:
+        raise SystemExit(0 if runSuite(args.max_depth, args.max_nodes, count) else 1)
+
+    gs = chessEngine.GameState(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        results = divide(gs, args.depth, count)
+        for move, nodes in sorted(results.items()):
+            print("{}: {}".format(move, nodes))
+        nodes = sum(results.values())
+    else:
+        nodes = count(gs, args.depth)
+    seconds = time.perf_counter() - start
+    print("nodes {} time {:.2f}s nps {:.0f}".format(nodes, seconds, nodes / max(seconds, 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
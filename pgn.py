@@ -0,0 +1,178 @@
+# Streaming PGN reader and batch game analyser. Games are read one at a time from any iterable of
+# lines, so a file of any size is never held in memory, and results are written out as JSON lines.
+
+import argparse
+import json
+import re
+import sys
+
+import chessEngine
+import AI
+
+HEADER = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+SAN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+MOVE_NUMBER = re.compile(r"\d+\.+")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+class PgnGame:
+    """Tag pairs and SAN moves of one game"""
+    def __init__(self, headers: dict, moves: list):
+        self.headers = headers
+        self.moves = moves
+        self.result = headers.get("Result", "*")
+
+    def startPosition(self) -> chessEngine.GameState:
+        return chessEngine.GameState(self.headers.get("FEN"))
+
+    def positions(self, cache: chessEngine.PositionCache = None):
+        """Replay the game, yield (game state, Move about to be played) before every move"""
+        gs = self.startPosition()
+        for san in self.moves:
+            if cache is None:
+                valid_moves = gs.getValidMoves()
+            else:
+                valid_moves = [chessEngine.Move.fromCode(code, gs.board) for code in cache.lookup(gs.getFen())[0]]
+            move = findMove(san, valid_moves)
+            yield gs, move
+            gs.makeMove(move)
+
+
+def readGames(lines):
+    """Yield a PgnGame for every game in an iterable of lines, e.g. an open file"""
+    headers = {}
+    movetext = []
+    comment_depth = 0  # a '[' at the start of a line inside a multi-line comment is not a tag
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("%"):
+            continue
+        if comment_depth == 0 and line.startswith("["):
+            match = HEADER.match(line)
+            if match:
+                if movetext:  # tags after movetext start the next game
+                    yield PgnGame(headers, parseMoveText("\n".join(movetext)))
+                    headers, movetext = {}, []
+                headers[match.group(1)] = match.group(2)
+                continue
+        movetext.append(line)
+        comment_depth += line.count("{") - line.count("}")
+    if headers or movetext:
+        yield PgnGame(headers, parseMoveText("\n".join(movetext)))
+
+
+def parseMoveText(text: str) -> list:
+    """SAN moves of the main line, without move numbers, comments, variations, NAGs and the result"""
+    main_line = []
+    variation_depth = 0
+    in_comment = False
+    in_line_comment = False
+    for char in text:
+        if in_comment:
+            in_comment = char != "}"
+        elif in_line_comment:
+            in_line_comment = char != "\n"
+        elif char == "{":
+            in_comment = True
+        elif char == ";":
+            in_line_comment = True
+        elif char == "(":
+            variation_depth += 1
+        elif char == ")":
+            variation_depth = max(0, variation_depth - 1)
+        elif variation_depth == 0:
+            main_line.append(char)
+    main_line = MOVE_NUMBER.sub(" ", "".join(main_line).replace("e.p.", " "))
+    return [token.rstrip("+#!?") for token in main_line.split() if token not in RESULTS and token[0] != "$"]
+
+
+def findMove(san: str, valid_moves: list) -> chessEngine.Move:
+    """The valid move written as san, accepts both O-O and the 0-0 that Move.getChessNotation uses"""
+    san = san.rstrip("+#!?")
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        castle_col = 6 if len(san) == 3 else 2
+        for move in valid_moves:
+            if move.is_castle_move and move.end_col == castle_col:
+                return move
+        raise ValueError("illegal move: " + san)
+    match = SAN.match(san)
+    if not match:
+        raise ValueError("invalid move: " + san)
+    piece, from_file, from_rank, end, promotion = match.groups()
+    piece = piece or "p"
+    end_row, end_col = chessEngine.Move.ranks_to_rows[end[1]], chessEngine.Move.files_to_cols[end[0]]
+    found = None
+    for move in valid_moves:
+        if move.piece_moved[1] != piece or move.end_row != end_row or move.end_col != end_col:
+            continue
+        if from_file and move.start_col != chessEngine.Move.files_to_cols[from_file]:
+            continue
+        if from_rank and move.start_row != chessEngine.Move.ranks_to_rows[from_rank]:
+            continue
+        if move.promotion_piece != (promotion or ""):
+            continue
+        if found is not None:
+            raise ValueError("ambiguous move: " + san)
+        found = move
+    if found is None:
+        raise ValueError("illegal move: " + san)
+    return found
+
+
+def analyseGames(lines, out, depth: int = 0, max_time: float = None, cache_size: int = 100000) -> int:
+    """
+    Evaluate every position of every game and write one JSON object per position to out.
+    depth 0 uses the static evaluation, deeper searches also report the engine's best move.
+    Returns the number of games read.
+    """
+    cache = chessEngine.PositionCache(cache_size)  # bounded, positions of popular openings repeat a lot
+    games = 0
+    for game_number, game in enumerate(readGames(lines), 1):
+        games = game_number
+        try:
+            ply = 0
+            for gs, move in game.positions(cache):
+                out.write(json.dumps(analysePosition(gs, cache, depth, max_time, game_number, ply, move)) + "\n")
+                ply += 1
+        except ValueError as error:  # bad movetext, skip the rest of the game
+            out.write(json.dumps({"game": game_number, "ply": ply, "error": str(error)}) + "\n")
+    return games
+
+
+def analysePosition(gs, cache: chessEngine.PositionCache, depth: int, max_time: float, game_number: int, ply: int,
+                    move: chessEngine.Move) -> dict:
+    fen = gs.getFen()
+    codes, score = cache.lookup(fen)
+    record = {"game": game_number, "ply": ply, "fen": fen, "move": move.getUciNotation(), "san": str(move),
+              "eval": score if gs.white_to_move else -score}  # centipawns from white's point of view
+    if depth > 0:
+        search = AI.Search(max_time)
+        best_move = search.iterate(gs, [chessEngine.Move.fromCode(code, gs.board) for code in codes], depth)
+        record["best"] = best_move.getUciNotation()
+        record["score"] = search.score if gs.white_to_move else -search.score
+        record["depth"] = search.depth
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate every position of a PGN file, write JSON lines")
+    parser.add_argument("pgn", help="PGN file to read, - for standard input")
+    parser.add_argument("-o", "--output", default="-", help="JSON lines file to write, - for standard output")
+    parser.add_argument("--depth", type=int, default=0, help="search depth, 0 for the static evaluation")
+    parser.add_argument("--time", type=float, default=None, help="seconds per position for searches")
+    parser.add_argument("--cache-size", type=int, default=100000, help="positions kept in the position cache")
+    args = parser.parse_args()
+
+    pgn_file = sys.stdin if args.pgn == "-" else open(args.pgn, encoding="utf-8", errors="replace")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        analyseGames(pgn_file, out, args.depth, args.time, args.cache_size)
+    finally:
+        if pgn_file is not sys.stdin:
+            pgn_file.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Opt-in counters for the search and GameState. Nothing is counted unless a SearchStats object is
+# passed to the search, which hands it to the GameState for the duration of the search; disabled
+# counters cost one "is not None" test each.
+
+class SearchStats:
+    """Counters of one or more searches, report() gives them as a dict"""
+    def __init__(self):
+        # search
+        self.nodes = 0
+        self.quiescence_nodes = 0  # included in nodes
+        self.expanded_nodes = 0  # nodes whose moves were generated and searched
+        self.legal_moves = 0  # legal moves found at expanded nodes
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0  # cutoffs on the first move searched, a measure of move ordering
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tablebase_hits = 0
+        self.depth_times = {}  # depth: seconds since the start of the search when the iteration finished
+        self.depth_nodes = {}  # depth: nodes searched by then
+        # GameState
+        self.valid_move_generations = 0
+        self.pseudo_legal_generations = 0
+        self.capture_generations = 0
+        self.quiet_generations = 0
+        self.pin_and_check_scans = 0
+        self.attack_tests = 0
+        self.attack_map_builds = 0
+
+    def recordIteration(self, depth: int, seconds: float, nodes: int) -> None:
+        self.depth_times[depth] = seconds
+        self.depth_nodes[depth] = nodes
+
+    def branchingFactor(self) -> float:
+        """Average number of legal moves at the expanded nodes"""
+        return self.legal_moves / self.expanded_nodes if self.expanded_nodes else 0.0
+
+    def effectiveBranchingFactor(self) -> float:
+        """Nodes of the last finished iteration divided by the nodes of the one before it"""
+        depths = sorted(self.depth_nodes)
+        if len(depths) < 2:
+            return 0.0
+        counts = [self.depth_nodes[depth] for depth in depths]  # cumulative
+        last = counts[-1] - counts[-2]
+        previous = counts[-2] - (counts[-3] if len(counts) > 2 else 0)
+        return last / previous if previous else 0.0
+
+    def report(self) -> dict:
+        return {
+            "nodes": self.nodes,
+            "quiescence_nodes": self.quiescence_nodes,
+            "expanded_nodes": self.expanded_nodes,
+            "branching_factor": self.branchingFactor(),
+            "effective_branching_factor": self.effectiveBranchingFactor(),
+            "cutoffs": self.cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "tt_hit_rate": self.tt_hits / self.tt_probes if self.tt_probes else 0.0,
+            "tablebase_hits": self.tablebase_hits,
+            "depth_times": dict(self.depth_times),
+            "depth_nodes": dict(self.depth_nodes),
+            "valid_move_generations": self.valid_move_generations,
+            "pseudo_legal_generations": self.pseudo_legal_generations,
+            "capture_generations": self.capture_generations,
+            "quiet_generations": self.quiet_generations,
+            "pin_and_check_scans": self.pin_and_check_scans,
+            "attack_tests": self.attack_tests,
+            "attack_map_builds": self.attack_map_builds,
+        }
+
+    def __str__(self):
+        lines = []
+        for key, value in self.report().items():
+            if isinstance(value, float):
+                value = "{:.3f}".format(value)
+            elif isinstance(value, dict):
+                value = " ".join("{}:{}".format(depth, round(v, 3) if isinstance(v, float) else v)
+                                 for depth, v in value.items())
+            lines.append("{:<28} {}".format(key, value))
+        return "\n".join(lines)
@@ -0,0 +1,294 @@
+# Self-play match runner. Plays two engine configurations against each other from a set of opening
+# positions, each opening with both colours, in parallel worker processes. Reports win/draw/loss,
+# an Elo estimate with error margin, an SPRT decision, and the time and nodes per second of every engine.
+#
+#   python selfPlay.py --engine new:module=AI --engine old:module=AI_old --tc 10+0.1 --games 1000 --sprt 0 10
+
+import argparse
+import importlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import chessEngine
+from uci import timeForMove
+
+# balanced positions a few moves into common openings
+OPENINGS = (
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pp1ppppp/2p5/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkb1r/pppppppp/5n2/8/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 1 2",
+    "rnbqkbnr/pppppppp/8/8/2P5/8/PP1PPPPP/RNBQKBNR b KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/5N2/PPPPPPPP/RNBQKB1R b KQkq - 1 1",
+    "r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",
+    "rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5",
+    "rnbqkb1r/ppp1pppp/5n2/3p4/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 1 3",
+)
+MAX_PLIES = 300  # longer games are adjudicated as draws
+RESIGN_SCORE = 1000  # centipawns both engines must agree on ...
+RESIGN_MOVES = 6  # ... for this many moves in a row to adjudicate a win
+SCORE_EPSILON = 0.001  # score bounds of the Elo margin are kept this far from 0 and 1, about 1200 Elo
+ENGINE_HASH_MB = 4
+
+
+def parseEngine(text: str) -> dict:
+    """Engine configuration from NAME:key=value,key=value, keys are module, depth, nodes and hash"""
+    name, _, options = text.partition(":")
+    config = {"name": name, "module": "AI", "depth": None, "nodes": None, "hash": ENGINE_HASH_MB}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key not in config or key == "name":
+            raise ValueError("unknown engine option: " + key)
+        config[key] = value if key == "module" else int(value)
+    return config
+
+
+def parseTimeControl(text: str) -> tuple:
+    """Seconds on the clock and increment per move from BASE+INC, e.g. 10+0.1"""
+    base, _, increment = text.partition("+")
+    return float(base), float(increment or 0)
+
+
+def insufficientMaterial(gs) -> bool:
+    """Neither side can mate: bare kings, or a single minor piece left"""
+    bitboards = gs.bitboards
+    if bitboards["wp"] | bitboards["bp"] | bitboards["wR"] | bitboards["bR"] | bitboards["wQ"] | bitboards["bQ"]:
+        return False
+    minors = bitboards["wN"] | bitboards["bN"] | bitboards["wB"] | bitboards["bB"]
+    return minors & (minors - 1) == 0
+
+
+def playGame(game_number: int, fen: str, white: dict, black: dict, time_control: tuple = None,
+             move_time: float = None) -> dict:
+    """Play one game between two engine configurations, runs in a worker process"""
+    engines = [white, black]
+    modules = [importlib.import_module(config["module"]) for config in engines]
+    tables = [module.TranspositionTable(config["hash"]) for module, config in zip(modules, engines)]
+    clocks = [time_control[0], time_control[0]] if time_control else None
+    gs = chessEngine.GameState(fen)
+    moves, times, nodes = [], [], []
+    decisive_scores = 0
+    result, reason = None, None
+    while result is None:
+        side = 0 if gs.white_to_move else 1
+        valid_moves = gs.getValidMoves()
+        if not valid_moves:
+            if gs.inCheck():
+                result, reason = ("0-1" if side == 0 else "1-0"), "checkmate"
+            else:
+                result, reason = "1/2-1/2", "stalemate"
+            break
+
+        if clocks is not None:
+            max_time = timeForMove({"wtime": clocks[0] * 1000, "btime": clocks[1] * 1000,
+                                    "winc": time_control[1] * 1000, "binc": time_control[1] * 1000},
+                                   side == 0)
+        else:
+            max_time = move_time
+        config, module = engines[side], modules[side]
+        start = time.perf_counter()
+        search = module.Search(max_time, config["nodes"], tables[side])
+        move = search.iterate(gs, valid_moves, config["depth"] or module.MAX_DEPTH)
+        seconds = time.perf_counter() - start
+        moves.append(move.getUciNotation())
+        times.append(seconds)
+        nodes.append(search.nodes)
+        gs.makeMove(move)
+
+        if clocks is not None:
+            clocks[side] -= seconds
+            if clocks[side] < 0:
+                result, reason = ("0-1" if side == 0 else "1-0"), "time forfeit"
+                break
+            clocks[side] += time_control[1]
+        # a long run of lopsided scores from both engines ends the game early
+        score = search.score if side == 0 else -search.score  # from white's point of view
+        if abs(score) < RESIGN_SCORE:
+            decisive_scores = 0
+        elif score > 0:
+            decisive_scores = max(decisive_scores, 0) + 1
+        else:
+            decisive_scores = min(decisive_scores, 0) - 1
+        if abs(decisive_scores) >= RESIGN_MOVES:
+            result, reason = ("1-0" if decisive_scores > 0 else "0-1"), "adjudicated win"
+        elif gs.isThreefoldRepetition():
+            result, reason = "1/2-1/2", "threefold repetition"
+        elif gs.isFiftyMoveDraw():
+            result, reason = "1/2-1/2", "fifty moves"
+        elif insufficientMaterial(gs):
+            result, reason = "1/2-1/2", "insufficient material"
+        elif len(moves) >= MAX_PLIES:
+            result, reason = "1/2-1/2", "adjudicated draw"
+
+    return {"game": game_number, "fen": fen, "white": white["name"], "black": black["name"], "result": result,
+            "reason": reason, "moves": moves, "times": times, "nodes": nodes}
+
+
+class MatchStats:
+    """Results from the first engine's point of view and search performance of both engines"""
+    def __init__(self, names: list):
+        self.names = names
+        self.wins = self.draws = self.losses = 0
+        self.reasons = {}
+        self.moves = {name: 0 for name in names}
+        self.seconds = {name: 0.0 for name in names}
+        self.max_seconds = {name: 0.0 for name in names}
+        self.nodes = {name: 0 for name in names}
+
+    def record(self, game: dict) -> None:
+        first_is_white = game["white"] == self.names[0]
+        if game["result"] == "1/2-1/2":
+            self.draws += 1
+        elif (game["result"] == "1-0") == first_is_white:
+            self.wins += 1
+        else:
+            self.losses += 1
+        self.reasons[game["reason"]] = self.reasons.get(game["reason"], 0) + 1
+        for ply, (seconds, nodes) in enumerate(zip(game["times"], game["nodes"])):
+            name = game["white"] if ply % 2 == 0 else game["black"]
+            if game["fen"].split()[1] == "b":
+                name = game["black"] if ply % 2 == 0 else game["white"]
+            self.moves[name] += 1
+            self.seconds[name] += seconds
+            self.max_seconds[name] = max(self.max_seconds[name], seconds)
+            self.nodes[name] += nodes
+
+    def games(self) -> int:
+        return self.wins + self.draws + self.losses
+
+    def elo(self) -> tuple:
+        """Elo difference of the first engine and its 95% error margin"""
+        games = self.games()
+        if games == 0:
+            return 0.0, 0.0
+        score = (self.wins + self.draws / 2) / games
+        if not 0 < score < 1:
+            return scoreToElo(score), float("inf")
+        variance = (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 +
+                    self.losses * score ** 2) / games
+        margin = 1.96 * math.sqrt(variance / games)
+        # small samples easily put a bound outside (0, 1), where the Elo scale is infinite
+        upper = min(score + margin, 1 - SCORE_EPSILON)
+        lower = max(score - margin, SCORE_EPSILON)
+        return scoreToElo(score), (scoreToElo(upper) - scoreToElo(lower)) / 2
+
+    def sprt(self, elo0: float, elo1: float, alpha: float = 0.05, beta: float = 0.05) -> tuple:
+        """Log likelihood ratio of elo1 against elo0 and the decision: "H1", "H0" or None to keep playing"""
+        games = self.games()
+        if games == 0 or self.wins + self.draws == 0 or self.losses + self.draws == 0:
+            return 0.0, None
+        score = (self.wins + self.draws / 2) / games
+        variance = (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 +
+                    self.losses * score ** 2) / games
+        if variance <= 0:
+            return 0.0, None
+        score0, score1 = eloToScore(elo0), eloToScore(elo1)
+        llr = games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)  # normal approximation
+        if llr >= math.log((1 - beta) / alpha):
+            return llr, "H1"
+        if llr <= math.log(beta / (1 - alpha)):
+            return llr, "H0"
+        return llr, None
+
+    def report(self) -> str:
+        elo, margin = self.elo()
+        lines = ["{} vs {}: {} games, +{} ={} -{}, elo {:+.1f} +/- {:.1f}".format(
+            self.names[0], self.names[1], self.games(), self.wins, self.draws, self.losses, elo, margin)]
+        lines.append("endings: " + ", ".join("{} {}".format(reason, count)
+                                             for reason, count in sorted(self.reasons.items())))
+        for name in self.names:
+            moves = max(self.moves[name], 1)
+            lines.append("{}: {} moves, {:.3f}s per move, {:.3f}s longest, {:.0f} nps".format(
+                name, self.moves[name], self.seconds[name] / moves, self.max_seconds[name],
+                self.nodes[name] / max(self.seconds[name], 1e-9)))
+        return "\n".join(lines)
+
+
+def scoreToElo(score: float) -> float:
+    if score <= 0:
+        return -float("inf")
+    if score >= 1:
+        return float("inf")
+    return -400 * math.log10(1 / score - 1)
+
+
+def eloToScore(elo: float) -> float:
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def runMatch(first: dict, second: dict, games: int, openings: tuple = OPENINGS, workers: int = None,
+             time_control: tuple = None, move_time: float = 0.1, sprt_bounds: tuple = None, log=None) -> MatchStats:
+    """Play up to games games, every opening once with each colour; stop early once the SPRT decides"""
+    stats = MatchStats([first["name"], second["name"]])
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for game_number in range(games):
+            fen = openings[(game_number // 2) % len(openings)]
+            white, black = (first, second) if game_number % 2 == 0 else (second, first)
+            futures.append(executor.submit(playGame, game_number, fen, white, black, time_control, move_time))
+        for future in as_completed(futures):
+            game = future.result()
+            stats.record(game)
+            if log is not None:
+                log.write(json.dumps(game) + "\n")
+            if sprt_bounds is not None and stats.sprt(*sprt_bounds)[1] is not None:
+                for pending in futures:
+                    pending.cancel()
+                break
+    return stats
+
+
+def loadOpenings(path: str) -> tuple:
+    """FEN or EPD positions, one per line"""
+    openings = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            fields = line.split(";")[0].split()
+            if len(fields) >= 4:
+                openings.append(" ".join(fields[:6] if len(fields) >= 6 and fields[4].isdigit() else fields[:4]))
+    return tuple(openings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play two engine configurations against each other")
+    parser.add_argument("--engine", action="append", type=parseEngine, required=True,
+                        help="NAME:module=AI,depth=N,nodes=N,hash=MB, given twice")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="processes, default one per CPU")
+    parser.add_argument("--tc", type=parseTimeControl, default=None, help="clock per game as BASE+INC seconds")
+    parser.add_argument("--movetime", type=float, default=0.1, help="seconds per move when no --tc is given")
+    parser.add_argument("--openings", default=None, help="file of FEN/EPD opening positions")
+    parser.add_argument("--sprt", type=float, nargs=2, metavar=("ELO0", "ELO1"), default=None,
+                        help="stop when the SPRT accepts either hypothesis (alpha = beta = 0.05)")
+    parser.add_argument("--log", default=None, help="JSON lines file with every game, its moves and move times")
+    args = parser.parse_args()
+    if len(args.engine) != 2:
+        parser.error("give exactly two --engine configurations")
+    if args.engine[0]["name"] == args.engine[1]["name"]:
+        parser.error("engine names must differ")
+
+    openings = loadOpenings(args.openings) if args.openings else OPENINGS
+    log = open(args.log, "w", encoding="utf-8") if args.log else None
+    try:
+        stats = runMatch(args.engine[0], args.engine[1], args.games, openings, args.workers, args.tc, args.movetime,
+                         tuple(args.sprt) if args.sprt else None, log)
+    finally:
+        if log is not None:
+            log.close()
+    print(stats.report())
+    if args.sprt:
+        llr, decision = stats.sprt(*args.sprt)
+        print("SPRT elo0 {} elo1 {}: LLR {:.2f} ({:.2f}, {:.2f}) {}".format(
+            args.sprt[0], args.sprt[1], llr, math.log(0.05 / 0.95), math.log(0.95 / 0.05),
+            {"H1": "H1 accepted", "H0": "H0 accepted", None: "inconclusive"}[decision]))
+
+
+if __name__ == "__main__":
+    main()
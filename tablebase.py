@@ -0,0 +1,84 @@
+# Optional Syzygy endgame tablebase probing through the python-chess package (pip install chess).
+# Its tablebase keeps the table files open and memory-mapped; probe results are cached here by
+# zobrist key, so positions the search visits again are answered without touching the tables.
+
+import os
+from array import array
+from collections import OrderedDict
+
+from bitboard import popCount
+from chessEngine import CAPTURE, PROMOTION
+
+try:
+    import chess
+    import chess.syzygy
+except ImportError:  # probing is optional, the engine runs without it
+    chess = None
+
+CACHE_SIZE = 100000
+
+
+class Tablebase:
+    """Syzygy WDL and DTZ tables in one or more directories, separated like PATH"""
+    def __init__(self, path: str, cache_size: int = CACHE_SIZE):
+        if chess is None:
+            raise ImportError("Syzygy probing needs the python-chess package")
+        self.tables = chess.syzygy.Tablebase()
+        self.max_pieces = 0
+        for directory in path.split(os.pathsep):
+            if self.tables.add_directory(directory):
+                for name in os.listdir(directory):
+                    if name.endswith(".rtbw"):  # e.g. KQvK.rtbw
+                        self.max_pieces = max(self.max_pieces, len(name) - len(".rtbw") - 1)
+        self.cache_size = cache_size
+        self.wdl_cache = OrderedDict()
+        self.dtz_cache = OrderedDict()
+
+    def close(self) -> None:
+        self.tables.close()
+
+    def canProbe(self, gs) -> bool:
+        """Few enough pieces, and no castling rights, which the tables don't cover"""
+        return popCount(gs.occupied) <= self.max_pieces and not gs.castling_rights
+
+    def probeWdl(self, gs) -> int:
+        """Win/draw/loss for the side to move: 2 win, 1 win spoiled by the fifty move rule, 0 draw, -1, -2; or None"""
+        return self.probe(gs, self.wdl_cache, self.tables.get_wdl)
+
+    def probeDtz(self, gs) -> int:
+        """Plies to the next capture or pawn move with best play, negative when losing; or None"""
+        return self.probe(gs, self.dtz_cache, self.tables.get_dtz)
+
+    def probe(self, gs, cache: OrderedDict, probe_function) -> int:
+        key = gs.zobrist_key
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        result = probe_function(chess.Board(gs.getFen()))
+        cache[key] = result
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return result
+
+    def bestMove(self, gs, validMoves: list):
+        """The move keeping the best result in the fewest moves to conversion, None if a table is missing"""
+        best_move, best_key = None, None
+        for move in validMoves:
+            gs.makeMove(move)
+            if not gs.generateValidMoves(array("H")) and gs.inCheck():
+                gs.undoMove()
+                return move  # mate
+            wdl, dtz = self.probeWdl(gs), self.probeDtz(gs)
+            gs.undoMove()
+            if wdl is None or dtz is None:
+                return None
+            zeroing = move.code >> 12 & (CAPTURE | PROMOTION) or move.piece_moved[1] == "p"
+            if wdl < 0:  # winning: reach the next conversion fastest, a zeroing move converts right away
+                key = (-wdl, 1 if zeroing else 0, dtz)
+            elif wdl > 0:  # losing: hold out as long as possible
+                key = (-wdl, 0, dtz)
+            else:
+                key = (0, 0, 0)
+            if best_key is None or key > best_key:
+                best_move, best_key = move, key
+        return best_move
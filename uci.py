@@ -0,0 +1,213 @@
+# UCI front-end. Reads commands from standard input and searches on a background thread, so that
+# stop and isready are answered while the engine is thinking. Run it as the engine command in a GUI.
+
+import sys
+import threading
+import time
+
+import chessEngine
+import AI
+
+ENGINE_NAME = "UVPchess"
+MOVE_OVERHEAD = 0.05  # seconds kept back for the reply to reach the GUI
+DEFAULT_MOVES_TO_GO = 30
+
+
+class UciEngine:
+    """State of one UCI session: the current position, the transposition table and the running search"""
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.output_lock = threading.Lock()
+        self.gs = chessEngine.GameState()
+        self.tt = AI.TranspositionTable(AI.TT_SIZE_MB)
+        self.search = None
+        self.search_thread = None
+        self.limits = {}  # of the running search
+        # set when an infinite or ponder search may send its bestmove: after stop, quit or ponderhit
+        self.release = threading.Event()
+
+    def send(self, line: str) -> None:
+        with self.output_lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def handleCommand(self, line: str) -> bool:
+        """Run one command, returns False on quit"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author UVPchess")
+            self.send("option name Hash type spin default {} min 1 max 1024".format(AI.TT_SIZE_MB))
+            self.send("option name SyzygyPath type string default <empty>")
+            self.send("option name Ponder type check default false")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.setOption(args)
+        elif command == "ucinewgame":
+            self.waitForSearch(stop=True)
+            self.tt.clear()
+            self.gs = chessEngine.GameState()
+        elif command == "position":
+            self.waitForSearch(stop=True)
+            self.position(args)
+        elif command == "go":
+            self.waitForSearch(stop=True)
+            self.go(args)
+        elif command == "ponderhit":
+            self.ponderHit()
+        elif command == "stop":
+            self.waitForSearch(stop=True)
+        elif command == "quit":
+            self.waitForSearch(stop=True)
+            return False
+        return True
+
+    def setOption(self, args: list) -> None:
+        text = " ".join(args)
+        if text.lower().startswith("name hash value "):
+            self.waitForSearch(stop=True)
+            self.tt = AI.TranspositionTable(int(text.split()[-1]))
+        elif text.lower().startswith("name syzygypath value "):
+            self.waitForSearch(stop=True)
+            path = text[len("name syzygypath value "):].strip()
+            AI.SYZYGY_PATH = None if path in ("", "<empty>") else path
+
+    def position(self, args: list) -> None:
+        """position startpos|fen <fen> [moves <move>...]"""
+        moves_at = args.index("moves") if "moves" in args else len(args)
+        if args and args[0] == "fen":
+            gs = chessEngine.GameState(" ".join(args[1:moves_at]))
+        else:
+            gs = chessEngine.GameState()
+        for uci_move in args[moves_at + 1:]:
+            move = findUciMove(gs, uci_move)
+            if move is None:
+                self.send("info string illegal move " + uci_move)
+                break
+            gs.makeMove(move)
+        self.gs = gs
+
+    def go(self, args: list) -> None:
+        """Start a search on a background thread with the limits of a go command"""
+        limits = parseGoArgs(args)
+        until_stopped = "infinite" in limits or "ponder" in limits  # bestmove only after stop or ponderhit
+        if not until_stopped:
+            valid_moves = self.gs.getValidMoves()
+            book_move = AI.findBookMove(self.gs, valid_moves)
+            if book_move is None:
+                book_move = AI.findTablebaseMove(self.gs, valid_moves)
+            if book_move is not None:
+                self.send("bestmove " + book_move.getUciNotation())
+                return
+        self.limits = limits
+        if until_stopped:
+            self.release.clear()
+        else:
+            self.release.set()
+        max_time = None if "ponder" in limits else timeForMove(limits, self.gs.white_to_move)
+        max_depth = limits.get("depth", AI.MAX_DEPTH)
+        self.search = AI.Search(max_time, limits.get("nodes"), self.tt, on_iteration=self.sendInfo)
+        self.search_thread = threading.Thread(target=self.runSearch, args=(self.search, self.gs, max_depth),
+                                              daemon=True)
+        self.search_thread.start()
+
+    def runSearch(self, search: AI.Search, gs, max_depth: int) -> None:
+        valid_moves = gs.getValidMoves()
+        best_move = search.iterate(gs, valid_moves, max_depth)
+        self.release.wait()  # a search that ends early by itself still waits for stop under go infinite
+        self.send("bestmove " + (best_move.getUciNotation() if best_move is not None else "0000"))
+
+    def sendInfo(self, search: AI.Search) -> None:
+        best_code, score = search.iterations[search.depth]
+        if abs(score) >= AI.CHECKMATE - AI.MAX_PLY:  # mate in moves, negative when getting mated
+            plies = AI.CHECKMATE - abs(score)
+            score_text = "mate {}".format((plies + 1) // 2 if score > 0 else -((plies + 1) // 2))
+        else:
+            score_text = "cp {}".format(score)
+        elapsed = search.elapsed()
+        line = search.principalVariation(self.gs, best_code)
+        pv = []
+        for code in line:  # decode against the board each move is played on
+            move = chessEngine.Move.fromCode(code, self.gs.board)
+            pv.append(move.getUciNotation())
+            self.gs.makeMove(code)
+        for _ in line:
+            self.gs.undoMove()
+        self.send("info depth {} score {} nodes {} nps {} time {} pv {}".format(
+            search.depth, score_text, search.nodes, int(search.nodes / max(elapsed, 1e-6)), int(elapsed * 1000),
+            " ".join(pv)))
+
+    def ponderHit(self) -> None:
+        """The opponent played the move pondered on: search on with the normal time for this move"""
+        if self.search_thread is None or "ponder" not in self.limits:
+            return
+        max_time = timeForMove(self.limits, self.gs.white_to_move)
+        if max_time is not None:
+            self.search.deadline = time.perf_counter() + max_time
+        self.release.set()
+
+    def waitForSearch(self, stop: bool = False) -> None:
+        """Wait for the running search to finish and send its bestmove, stopping it first if asked"""
+        if self.search_thread is None:
+            return
+        if stop:
+            self.search.stop()
+            self.release.set()
+        self.search_thread.join()
+        self.search_thread = None
+
+
+def findUciMove(gs, uci_move: str):
+    """The valid Move written in coordinate notation, or None"""
+    for move in gs.getValidMoves():
+        if move.getUciNotation() == uci_move:
+            return move
+    return None
+
+
+def parseGoArgs(args: list) -> dict:
+    """Limits of a go command, e.g. {"wtime": 60000, "depth": 8}; times stay in milliseconds"""
+    limits = {}
+    i = 0
+    while i < len(args):
+        if args[i] in ("wtime", "btime", "winc", "binc", "movestogo", "movetime", "depth", "nodes") and \
+                i + 1 < len(args):
+            limits[args[i]] = int(args[i + 1])
+            i += 2
+        else:
+            if args[i] in ("infinite", "ponder"):
+                limits[args[i]] = True
+            i += 1
+    return limits
+
+
+def timeForMove(limits: dict, white_to_move: bool) -> float:
+    """Seconds to think: the given movetime, a share of the clock, or no limit"""
+    if "infinite" in limits:
+        return None
+    if "movetime" in limits:
+        return max(0.01, limits["movetime"] / 1000 - MOVE_OVERHEAD)
+    clock = limits.get("wtime" if white_to_move else "btime")
+    if clock is None:
+        return None if "depth" in limits or "nodes" in limits else AI.MAX_TIME
+    increment = limits.get("winc" if white_to_move else "binc", 0)
+    moves_to_go = limits.get("movestogo", DEFAULT_MOVES_TO_GO)
+    share = clock / max(moves_to_go, 1) + increment * 3 / 4
+    return max(0.01, min(share, clock - MOVE_OVERHEAD * 1000 * 2) / 1000)
+
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handleCommand(line):
+            break
+    engine.waitForSearch(stop=True)
+
+
+if __name__ == "__main__":
+    main()